@@ -0,0 +1,114 @@
+"""Compare loading the part catalog from parts.jsonl and from the columnar
+catalog: load time, Python heap allocated, resident memory, and the cost
+of the common reads (PS number lookup, appliance-type scan, a full pass
+for chunking).
+
+    python -m benchmarks.bench_catalog --synthetic 50000
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import generate_parts, write_parts
+from services.catalog import Catalog, open_parts, write_catalog
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def measure(load) -> tuple:
+    """(result, seconds, Python heap MB, resident MB) for a load.
+
+    Timed without tracing; the heap is measured on a second, traced load."""
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    rss = rss_mb() - rss_before
+    tracemalloc.start()
+    traced = load()
+    heap = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    del traced
+    return result, elapsed, heap, rss
+
+
+def time_ms(fn, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parts", help="parts.jsonl to convert")
+    parser.add_argument("--synthetic", type=int, default=20000,
+                        help="number of synthetic parts when --parts is unset")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="partselect-catalog-")
+    parts_file = args.parts
+    if not parts_file:
+        parts_file = os.path.join(workdir, "parts.jsonl")
+        write_parts(generate_parts(args.synthetic), parts_file)
+    catalog_path = os.path.join(workdir, "catalog")
+    start = time.perf_counter()
+    write_catalog(catalog_path, open_parts(parts_file))
+    convert_s = time.perf_counter() - start
+
+    def size_mb(path: str) -> float:
+        if os.path.isfile(path):
+            return os.path.getsize(path) / 2**20
+        return sum(os.path.getsize(os.path.join(path, name))
+                   for name in os.listdir(path)) / 2**20
+
+    # The catalog first, so the JSONL heap does not inflate its RSS delta.
+    catalog, catalog_s, catalog_heap, catalog_rss = measure(
+        lambda: Catalog(catalog_path))
+    records, jsonl_s, jsonl_heap, jsonl_rss = measure(
+        lambda: open_parts(parts_file))
+
+    probe = records[len(records) // 2]["ps_number"]
+    rows = {
+        "load": (jsonl_s * 1000, catalog_s * 1000),
+        "find by PS number": (
+            time_ms(lambda: next(p for p in records
+                                 if p["ps_number"] == probe), 20),
+            time_ms(lambda: catalog.find(probe), 1000)),
+        "appliance_type scan": (
+            time_ms(lambda: [i for i, p in enumerate(records)
+                             if p.get("appliance_type") == "Dishwasher"], 5),
+            time_ms(lambda: catalog.category_rows(
+                "appliance_type", "Dishwasher"), 100)),
+        "full pass (3 fields)": (
+            time_ms(lambda: [(p.get("ps_number"), p.get("name"),
+                              p.get("compatible_models")) for p in records]),
+            time_ms(lambda: [(p.get("ps_number"), p.get("name"),
+                              p.get("compatible_models")) for p in catalog])),
+    }
+
+    print(f"\n{len(records)} parts; converted in {convert_s:.2f}s; "
+          f"JSONL {size_mb(parts_file):.1f} MB on disk, "
+          f"catalog {size_mb(catalog_path):.1f} MB on disk\n")
+    jsonl_pass, catalog_pass = rows["full pass (3 fields)"]
+    rows["load + full pass"] = (jsonl_s * 1000 + jsonl_pass,
+                                catalog_s * 1000 + catalog_pass)
+    print(f"{'':<24}{'JSONL dicts':>14}{'catalog':>14}")
+    print(f"{'Python heap MB':<24}{jsonl_heap:>14.1f}{catalog_heap:>14.2f}")
+    print(f"{'resident delta MB':<24}{jsonl_rss:>14.1f}{catalog_rss:>14.2f}")
+    for name, (jsonl_ms, catalog_ms) in rows.items():
+        print(f"{name + ' ms':<24}{jsonl_ms:>14.3f}{catalog_ms:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
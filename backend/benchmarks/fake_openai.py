@@ -0,0 +1,201 @@
+"""Local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Point OPENAI_BASE_URL at it to run the backend without network access.
+Latency is configurable per endpoint, and errors and stalls can be injected
+to exercise timeouts, retries, hedging and circuit breaking.
+
+    python -m benchmarks.fake_openai --port 8100 --chat-latency-ms 800
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+import re
+import threading
+import time
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+EMBEDDING_DIM = 1536
+
+
+class FakeOpenAIConfig:
+    def __init__(self, embed_latency_ms: float = 0.0,
+                 chat_latency_ms: float = 0.0,
+                 classify_latency_ms: float = 0.0,
+                 jitter: float = 0.2, dim: int = EMBEDDING_DIM,
+                 error_rate: float = 0.0, stall_rate: float = 0.0,
+                 stall_ms: float = 30000.0,
+                 fault_targets: tuple = ("embedding", "classify", "chat")):
+        self.embed_latency_ms = embed_latency_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.classify_latency_ms = classify_latency_ms
+        self.jitter = jitter
+        self.dim = dim
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.fault_targets = set(fault_targets)
+
+    def delay(self, latency_ms: float, target: str) -> float:
+        if (target in self.fault_targets and self.stall_rate
+                and random.random() < self.stall_rate):
+            return self.stall_ms / 1000
+        if latency_ms <= 0:
+            return 0.0
+        spread = latency_ms * self.jitter
+        return max(0.0, random.uniform(latency_ms - spread,
+                                       latency_ms + spread)) / 1000
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Deterministic bag-of-words embedding: texts sharing tokens are close,
+    so filtered and unfiltered searches return plausible neighbours."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        for i in range(0, 16, 4):
+            index = int.from_bytes(digest[i:i + 3], "little") % dim
+            vector[index] += 1.0 if digest[i + 3] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
+
+
+def injected_error(config: FakeOpenAIConfig, target: str):
+    if (target in config.fault_targets and config.error_rate
+            and random.random() < config.error_rate):
+        return JSONResponse(status_code=500, content={"error": {
+            "message": "Injected failure", "type": "server_error"
+        }})
+    return None
+
+
+def create_app(config: FakeOpenAIConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(config.delay(config.embed_latency_ms, "embedding"))
+        error = injected_error(config, "embedding")
+        if error:
+            return error
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(text, config.dim)
+            if body.get("encoding_format") == "base64":
+                encoded = base64.b64encode(vector.tobytes()).decode()
+            else:
+                encoded = vector.tolist()
+            data.append({"object": "embedding", "index": i,
+                         "embedding": encoded})
+        tokens = sum(len(text.split()) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body["messages"]
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        is_classify = (body.get("max_tokens") or 0) <= 20
+        target = "classify" if is_classify else "chat"
+        latency = (config.classify_latency_ms if is_classify
+                   else config.chat_latency_ms)
+        await asyncio.sleep(config.delay(latency, target))
+        error = injected_error(config, target)
+        if error:
+            return error
+
+        if is_classify:
+            lower = prompt.lower()
+            content = "ON_TOPIC"
+            if "dishwasher" in lower:
+                content = "ON_TOPIC DISHWASHER"
+            elif any(w in lower for w in ["fridge", "refrigerator", "freezer"]):
+                content = "ON_TOPIC REFRIGERATOR"
+        else:
+            # Echo the first part in the retrieved context, as GPT-4 would
+            # when it recommends a part.
+            ps = re.search(r"PS\d{6,}", messages[0].get("content") or "")
+            content = (f"Based on the catalog, **{ps.group(0)}** should "
+                       f"help. Check the part details below."
+                       if ps else "I could not find a matching part.")
+
+        prompt_tokens = len(prompt.split())
+        completion_tokens = len(content.split())
+        return {
+            "id": f"chatcmpl-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    return app
+
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn on a daemon thread."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.config = uvicorn.Config(app, host=host, port=port,
+                                     log_level="warning", access_log=False)
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embed-latency-ms", type=float, default=30)
+    parser.add_argument("--classify-latency-ms", type=float, default=300)
+    parser.add_argument("--chat-latency-ms", type=float, default=1500)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--fault-targets", default="embedding,classify,chat")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(FakeOpenAIConfig(
+        embed_latency_ms=args.embed_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        classify_latency_ms=args.classify_latency_ms,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        fault_targets=tuple(args.fault_targets.split(","))
+    )), host=args.host, port=args.port)
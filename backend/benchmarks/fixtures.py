@@ -0,0 +1,89 @@
+import json
+import random
+
+PART_TYPES = {
+    "Refrigerator": [
+        "Door Shelf Bin", "Water Filter", "Ice Maker Assembly",
+        "Defrost Thermostat", "Evaporator Fan Motor", "Door Gasket",
+        "Crisper Drawer", "Water Inlet Valve", "Temperature Sensor",
+    ],
+    "Dishwasher": [
+        "Drain Pump", "Upper Rack Wheel", "Spray Arm", "Door Latch",
+        "Detergent Dispenser", "Door Gasket", "Heating Element",
+        "Float Switch", "Silverware Basket",
+    ],
+}
+BRANDS = ["Whirlpool", "GE", "Samsung", "LG", "Frigidaire", "KitchenAid",
+          "Maytag", "Bosch", "Kenmore"]
+MODEL_PREFIXES = ["WDT", "WRS", "FFSS", "GNE", "RF", "LFX", "KDTE", "MDB",
+                  "SHX", "DGHX", "GSS", "WRF"]
+SYMPTOMS = ["Leaking", "Not cooling", "Noisy", "Will not start",
+            "Not draining", "Door won't close", "Ice maker not working",
+            "Not cleaning dishes properly"]
+
+
+def generate_parts(n: int, seed: int = 7) -> list:
+    """Synthetic catalog shaped like the scraper's parts.jsonl records."""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(n):
+        appliance = "Refrigerator" if i % 2 == 0 else "Dishwasher"
+        brand = rng.choice(BRANDS)
+        part_type = rng.choice(PART_TYPES[appliance])
+        ps = f"PS{10000000 + i * 37:08d}"
+        oem = f"{rng.randint(100000000, 999999999)}"
+        models = sorted({
+            f"{rng.choice(MODEL_PREFIXES)}{rng.randint(100, 9999)}"
+            f"{rng.choice('ABCDEFGHJKLMNPRSTW')}{rng.randint(0, 9)}"
+            for _ in range(rng.randint(5, 60))
+        })
+        parts.append({
+            "source_url": f"https://www.partselect.com/{ps}-{brand}-{oem}.htm",
+            "ps_number": ps,
+            "name": f"{appliance} {part_type} {oem}",
+            "price": f"${rng.uniform(8, 250):.2f}",
+            "description": (
+                f"This manufacturer-certified {part_type.lower()} is made "
+                f"for {brand} {appliance.lower()}s. "
+                + " ".join(rng.choice(SYMPTOMS) for _ in range(3))
+            ),
+            "oem_part_number": oem,
+            "image_url": f"https://example.invalid/{ps}.jpg",
+            "compatible_models": models,
+            "in_stock": rng.random() > 0.15,
+            "symptoms_fixed": ", ".join(rng.sample(SYMPTOMS, 3)),
+            "installation_instructions": (
+                f"Unplug the {appliance.lower()}. Remove the old "
+                f"{part_type.lower()} and snap the new one into place."
+            ),
+            "appliance_type": appliance,
+        })
+    return parts
+
+
+def write_parts(parts: list, filepath: str):
+    with open(filepath, "w") as f:
+        for part in parts:
+            f.write(json.dumps(part) + "\n")
+
+
+def build_query_mix(parts: list, n: int, seed: int = 11) -> list:
+    """Replayable mix of queries covering each intent and guardrail path."""
+    rng = random.Random(seed)
+    templates = [
+        lambda p: f"How much is {p['ps_number']}?",
+        lambda p: f"How can I install part number {p['ps_number']}?",
+        lambda p: (f"Is {p['ps_number']} compatible with my "
+                   f"{rng.choice(p['compatible_models'])} model?"),
+        lambda p: (f"My {p['appliance_type'].lower()} is leaking, "
+                   f"what part do I need?"),
+        lambda p: f"Find parts for my {rng.choice(BRANDS)} refrigerator",
+        lambda p: f"Do you have {p['oem_part_number']}?",
+        lambda p: "What is the capital of France?",
+        lambda p: "The ice maker on my Whirlpool fridge is not working",
+    ]
+    queries = []
+    for _ in range(n):
+        part = rng.choice(parts)
+        queries.append(rng.choice(templates)(part))
+    return queries
@@ -0,0 +1,196 @@
+"""Offline load test for the chat backend.
+
+Starts a fake OpenAI server, seeds a throwaway Chroma collection from a
+fixture or synthetic parts.jsonl, serves main:app with uvicorn and replays a
+query mix against /api/chat. Reports latency percentiles and throughput for
+the full request and for each pipeline stage.
+
+    python -m benchmarks.run_bench --synthetic 500 --requests 300 \\
+        --concurrency 8 --chat-latency-ms 800
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import (
+    BackgroundServer, FakeOpenAIConfig, create_app
+)
+from benchmarks.fixtures import build_query_mix, generate_parts, write_parts
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms: list, elapsed_s: float = None) -> dict:
+    summary = {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+    }
+    if elapsed_s:
+        summary["rps"] = round(len(samples_ms) / elapsed_s, 1)
+    return summary
+
+
+async def replay(base_url: str, queries: list, concurrency: int) -> dict:
+    import httpx
+
+    latencies = []
+    stages = {}
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def one(query: str):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/chat", json={"message": query, "debug": True}
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+                return
+            timings = response.json().get("timings") or {}
+            for stage, ms in timings.get("stages_ms", {}).items():
+                stages.setdefault(stage, []).append(ms)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "chat": summarize(latencies, elapsed),
+        "errors": errors,
+        "server_stages": {stage: summarize(samples)
+                          for stage, samples in sorted(stages.items())},
+    }
+
+
+def time_calls(fn, args_list: list) -> list:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def bench_stages(service, queries: list) -> dict:
+    """Micro-benchmark the CPU-side stages in isolation."""
+    from services.guardrails import quick_topic_check
+
+    embeddings = service.embedding_service.embed_batch(queries[:200])
+    searches = [(e,) for e in embeddings]
+    results = [service.vector_store.search(e, n_results=5)
+               for e in embeddings]
+
+    return {
+        "quick_topic_check": summarize(
+            time_calls(quick_topic_check, [(q,) for q in queries])),
+        "_extract_entities": summarize(
+            time_calls(service._extract_entities, [(q,) for q in queries])),
+        "VectorStore.search": summarize(
+            time_calls(service.vector_store.search, searches)),
+        "_build_context": summarize(
+            time_calls(service._build_context, [(r,) for r in results])),
+    }
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"{'stage':<24}{'count':>8}{'p50 ms':>11}{'p95 ms':>11}"
+          f"{'p99 ms':>11}{'req/s':>9}")
+    for name, row in rows.items():
+        rps = f"{row['rps']:>9}" if "rps" in row else f"{'':>9}"
+        print(f"{name:<24}{row['count']:>8}{row['p50_ms']:>11}"
+              f"{row['p95_ms']:>11}{row['p99_ms']:>11}{rps}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parts", help="parts.jsonl fixture to index")
+    parser.add_argument("--synthetic", type=int, default=300,
+                        help="number of synthetic parts when --parts is unset")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--classify-latency-ms", type=float, default=0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="fraction of upstream calls that return 500")
+    parser.add_argument("--stall-rate", type=float, default=0,
+                        help="fraction of upstream calls that hang")
+    parser.add_argument("--fault-targets", default="embedding,classify,chat",
+                        help="upstreams the injected faults apply to")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="partselect-bench-")
+    fake_config = FakeOpenAIConfig(
+        embed_latency_ms=args.embed_latency_ms,
+        classify_latency_ms=args.classify_latency_ms,
+        chat_latency_ms=args.chat_latency_ms
+    )
+    fake = BackgroundServer(create_app(fake_config))
+    fake_url = fake.start()
+
+    # Settings are read at import time, so configure before importing them.
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"{fake_url}/v1"
+    os.environ["CHROMA_DB_PATH"] = os.path.join(workdir, "chroma_db")
+    os.environ["MODEL_INDEX_PATH"] = os.path.join(workdir, "model_index")
+
+    from indexer.build_index import build_index, load_parts
+
+    parts_file = args.parts
+    if not parts_file:
+        parts_file = os.path.join(workdir, "parts.jsonl")
+        write_parts(generate_parts(args.synthetic), parts_file)
+    build_index(parts_file)
+    parts = load_parts(parts_file)
+    queries = build_query_mix(parts, args.requests)
+
+    # Seed the index cleanly, then inject faults for the replay only.
+    fake_config.error_rate = args.error_rate
+    fake_config.stall_rate = args.stall_rate
+    fake_config.fault_targets = set(args.fault_targets.split(","))
+
+    from main import app
+    from routers.chat import get_rag_service
+
+    server = BackgroundServer(app)
+    base_url = server.start()
+    try:
+        report = asyncio.run(replay(base_url, queries, args.concurrency))
+        report["stages"] = bench_stages(get_rag_service(), queries)
+    finally:
+        server.stop()
+        fake.stop()
+
+    report["config"] = vars(args)
+    print_table("/api/chat", {"POST /api/chat": report["chat"]})
+    print(f"errors: {report['errors']}")
+    print_table("Server-side stages (from debug timings)",
+                report["server_stages"])
+    print_table("Isolated stages", report["stages"])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
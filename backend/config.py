@@ -4,11 +4,64 @@ from typing import List
 
 class Settings(BaseSettings):
     OPENAI_API_KEY: str
+    OPENAI_BASE_URL: str = ""
     OPENAI_MODEL: str = "gpt-4"
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_PROVIDER: str = "openai"
+    LOCAL_EMBEDDING_PATH: str = "./data/local_embedder.npz"
+    LOCAL_EMBEDDING_DIM: int = 256
     CHROMA_DB_PATH: str = "./data/chroma_db"
     CHROMA_COLLECTION_NAME: str = "partselect_parts"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 100
+    HNSW_EF_SEARCH: int = 100
+    INDEX_POINTER_POLL_SECONDS: float = 5.0
+    INDEX_GRACE_SECONDS: float = 300.0
+    ADMIN_TOKEN: str = ""
+    VECTOR_BACKEND: str = "chroma"
+    MMAP_INDEX_PATH: str = "./data/mmap_index"
+    MODEL_INDEX_PATH: str = "./data/model_index"
+    PARTS_PATH: str = "./data/parts.jsonl"
     MAX_CONTEXT_CHUNKS: int = 5
+    RETRIEVAL_FETCH_K: int = 20
+    DIVERSIFY_ENABLED: bool = True
+    MMR_LAMBDA: float = 0.7
+    NEAR_DUPLICATE_SIMILARITY: float = 0.95
+    CHUNKS_PER_PART: int = 1
+    CONTEXT_TOKEN_BUDGET: int = 1500
+    FAST_PATH_ENABLED: bool = True
+    THREADPOOL_SIZE: int = 64
+    CHAT_MAX_IN_FLIGHT: int = 40
+    EMBEDDING_MAX_CONCURRENCY: int = 16
+    CLASSIFY_MAX_CONCURRENCY: int = 16
+    CHAT_MAX_CONCURRENCY: int = 8
+    UPSTREAM_MAX_QUEUE: int = 32
+    UPSTREAM_QUEUE_TIMEOUT: float = 2.0
+    OVERLOAD_RETRY_AFTER: int = 2
+    EMBEDDING_TIMEOUT: float = 5.0
+    CLASSIFY_TIMEOUT: float = 5.0
+    CHAT_TIMEOUT: float = 30.0
+    UPSTREAM_MAX_RETRIES: int = 2
+    RETRY_BUDGET_RATIO: float = 0.1
+    HEDGE_UPSTREAMS: List[str] = ["embedding", "classify"]
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_DELAY: float = 0.05
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_PREEMBED_QUERIES: bool = False
+    WARMUP_RETRY_MAX_SECONDS: float = 60.0
+    SESSION_MAX_ENTRIES: int = 1000
+    SESSION_MAX_TURNS: int = 20
+    SESSION_DB_PATH: str = ""
+    SESSION_TTL_SECONDS: float = 604800.0
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_STATS_KEYS: int = 100
+    PROFILE_DIR: str = "./data/profiles"
+    PROFILE_TOKEN: str = ""
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_MAX_FILES: int = 200
 
     class Config:
         env_file = ".env"
@@ -1,22 +1,27 @@
-import json
+import argparse
 import os
 import sys
 
 # Add parent dir to path so we can import from services
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.embedding_service import EmbeddingService
-from services.vector_store import VectorStore
-
-
-def load_parts(filepath: str) -> list:
-    """Load parts from JSONL file."""
-    parts = []
-    with open(filepath, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                parts.append(json.loads(line))
+from config import settings
+from services.catalog import open_parts
+from services.embedding_service import (
+    embedding_service_for, local_embedder_path
+)
+from services.local_embedding import HashingSVDEmbedder
+from services.model_index import write_model_index
+from services.vector_store import (
+    VectorStore, new_collection_version, read_active_collection,
+    validate_collection, write_active_collection
+)
+from indexer.export_mmap import export_mmap
+
+
+def load_parts(filepath: str):
+    """Load parts from a JSONL file or a catalog directory."""
+    parts = open_parts(filepath)
     print(f"Loaded {len(parts)} parts from {filepath}")
     return parts
 
@@ -88,12 +93,26 @@ def create_chunks(part: dict) -> list:
     return chunks
 
 
-def build_index(parts_file: str = "data/parts.jsonl", batch_size: int = 50):
-    """Build the ChromaDB index from scraped parts data."""
-    parts = load_parts(parts_file)
+def train_local_embedder(documents: list, path: str) -> HashingSVDEmbedder:
+    """Fit the local embedding model on the chunk corpus and save it to
+    path."""
+    print(f"Training local embedder on {len(documents)} chunks...")
+    model = HashingSVDEmbedder().fit(
+        documents, dim=settings.LOCAL_EMBEDDING_DIM
+    )
+    model.save(path)
+    print(f"Saved {model.model_name} to {path}")
+    return model
 
-    embedding_service = EmbeddingService()
-    vector_store = VectorStore()
+
+def build_index(parts_file: str = "data/parts.jsonl", batch_size: int = 50,
+                activate: bool = True) -> str:
+    """Build the ChromaDB index from scraped parts data.
+
+    Builds into a new versioned collection while servers keep querying the
+    active one, validates it, and (with activate) points servers at it.
+    Returns the new collection's name."""
+    parts = load_parts(parts_file)
 
     # Create all chunks
     all_chunks = []
@@ -103,6 +122,21 @@ def build_index(parts_file: str = "data/parts.jsonl", batch_size: int = 50):
 
     print(f"Created {len(all_chunks)} chunks from {len(parts)} parts")
 
+    # A local embedder is trained per version and recorded in its
+    # collection, so servers keep using the one their index was built with
+    # until they switch to this version.
+    version = new_collection_version()
+    artifact = None
+    if settings.EMBEDDING_PROVIDER == "local":
+        artifact = local_embedder_path(version)
+        train_local_embedder([c["document"] for c in all_chunks], artifact)
+    embedding_service = embedding_service_for(artifact)
+    vector_store = VectorStore(version)
+    if vector_store.count():
+        raise RuntimeError(f"{vector_store.collection_name} already exists")
+    print(f"Building into {vector_store.collection_name} "
+          f"(serving: {read_active_collection()})")
+
     # Process in batches
     for i in range(0, len(all_chunks), batch_size):
         batch = all_chunks[i:i + batch_size]
@@ -122,10 +156,42 @@ def build_index(parts_file: str = "data/parts.jsonl", batch_size: int = 50):
             metadatas=metadatas
         )
 
+    vector_store.set_embedding_model(embedding_service.model_name, artifact)
+    problem = validate_collection(
+        vector_store.collection,
+        expected_count=len({c["id"] for c in all_chunks}),
+        embedding_model=embedding_service.model_name
+    )
+    if problem:
+        vector_store.drop()
+        if artifact:
+            os.remove(artifact)
+        raise RuntimeError(f"New index {vector_store.collection_name} failed "
+                           f"validation and was dropped: {problem}")
     total = vector_store.count()
-    print(f"\nIndexing complete! {total} documents in ChromaDB.")
+    print(f"\nIndexing complete! {total} documents in "
+          f"{vector_store.collection_name} ({embedding_service.model_name}).")
+
+    models = write_model_index(settings.MODEL_INDEX_PATH, parts)
+    print(f"Model index: {models} model numbers in {settings.MODEL_INDEX_PATH}")
+
+    if activate:
+        write_active_collection(vector_store.collection_name)
+        if settings.VECTOR_BACKEND == "mmap":
+            export_mmap(vector_store)
+        print(f"Activated {vector_store.collection_name}; running servers "
+              f"switch within {settings.INDEX_POINTER_POLL_SECONDS:g}s")
+    else:
+        print(f"Not activated. Switch with POST /api/admin/index/activate "
+              f'{{"collection": "{vector_store.collection_name}"}}')
+    return vector_store.collection_name
 
 
 if __name__ == "__main__":
-    parts_file = sys.argv[1] if len(sys.argv) > 1 else "data/parts.jsonl"
-    build_index(parts_file)
+    parser = argparse.ArgumentParser(description="Build the search index")
+    parser.add_argument("parts_file", nargs="?", default="data/parts.jsonl")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="build and validate, but keep serving the "
+                             "current index")
+    args = parser.parse_args()
+    build_index(args.parts_file, activate=not args.no_activate)
@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Add parent dir to path so we can import from services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.catalog import open_parts, write_catalog
+
+
+def convert_catalog(parts_file: str = "data/parts.jsonl",
+                    path: str = "data/catalog"):
+    """Convert the scraper's parts.jsonl into a columnar catalog."""
+    count = write_catalog(path, open_parts(parts_file))
+    print(f"Wrote {count} parts from {parts_file} to {path}")
+
+
+if __name__ == "__main__":
+    convert_catalog(*sys.argv[1:3])
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Add parent dir to path so we can import from services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.mmap_index import write_mmap_index
+from services.vector_store import VectorStore
+
+
+def export_mmap(vector_store: VectorStore = None, path: str = None,
+                page_size: int = 1000):
+    """Export the Chroma collection to the shared read-only mmap index as
+    a new version; mmap servers switch to it on their next pointer poll."""
+    vector_store = vector_store or VectorStore()
+    path = path or settings.MMAP_INDEX_PATH
+
+    ids, documents, embeddings, metadatas = [], [], [], []
+    total = vector_store.count()
+    for offset in range(0, total, page_size):
+        page = vector_store.collection.get(
+            limit=page_size, offset=offset,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        embeddings.extend(page["embeddings"])
+        metadatas.extend(page["metadatas"])
+
+    version = write_mmap_index(
+        path, ids, documents, embeddings, metadatas,
+        embedding_model=vector_store.embedding_model,
+        embedding_artifact=vector_store.embedding_artifact
+    )
+    print(f"Exported {len(ids)} documents to {path}/{version}")
+
+
+if __name__ == "__main__":
+    export_mmap(path=sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,221 @@
+"""Compare HNSW parameters on the indexed embeddings: recall@k against an
+exact brute-force search, query latency, build time and index size, with
+the Pareto-optimal settings marked.
+
+    python -m indexer.tune_hnsw --m 8,16,32 --ef-search 10,50,100,200
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add parent dir to path so we can import from services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.packed import normalize_rows
+from services.vector_store import VectorStore, hnsw_metadata
+
+
+def load_embeddings(collection_name: str = None,
+                    page_size: int = 1000) -> np.ndarray:
+    """Every embedding in the collection (the active one by default)."""
+    store = VectorStore(collection_name)
+    embeddings = []
+    for offset in range(0, store.count(), page_size):
+        page = store.collection.get(limit=page_size, offset=offset,
+                                    include=["embeddings"])
+        embeddings.extend(page["embeddings"])
+    print(f"Loaded {len(embeddings)} embeddings from "
+          f"{store.collection_name}")
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> list:
+    """Row numbers of the k nearest vectors by cosine, per query."""
+    scores = normalize_rows(queries) @ normalize_rows(vectors).T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def build(path: str, vectors: np.ndarray, m: int,
+          ef_construction: int) -> float:
+    """Build a candidate collection at path; returns seconds taken."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection(
+        "tune_hnsw", metadata=hnsw_metadata(m, ef_construction)
+    )
+    batch = client.get_max_batch_size()
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        chunk = vectors[i:i + batch]
+        collection.add(ids=[str(i + j) for j in range(len(chunk))],
+                       embeddings=chunk)
+    return time.perf_counter() - start
+
+
+def index_size(path: str) -> int:
+    """Bytes of HNSW segment files, leaving out the shared SQLite store."""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names
+               if not name.startswith("chroma.sqlite3"))
+
+
+def measure(path: str, queries: np.ndarray, truth: list, k: int,
+            ef_search: int) -> tuple:
+    """(recall@k, p50 ms, p95 ms) for one query at a time.
+
+    Chroma applies a new ef_search only when it loads the index, so each
+    value is measured on a fresh copy of the built collection."""
+    import chromadb
+
+    copy = f"{path}-ef{ef_search}"
+    shutil.copytree(path, copy)
+    try:
+        collection = chromadb.PersistentClient(path=copy).get_collection(
+            "tune_hnsw")
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        collection.query(query_embeddings=queries[:1], n_results=k,
+                         include=[])
+        hits, latencies = 0, []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query], n_results=k,
+                                      include=[])
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(expected & {int(i) for i in result["ids"][0]})
+    finally:
+        shutil.rmtree(copy, ignore_errors=True)
+    return (hits / (len(truth) * k), float(np.percentile(latencies, 50)),
+            float(np.percentile(latencies, 95)))
+
+
+def pareto(rows: list) -> list:
+    """Mark rows no other row beats on both recall and p95 latency."""
+    for row in rows:
+        row["pareto"] = not any(
+            other["recall"] >= row["recall"] and other["p95"] <= row["p95"]
+            and (other["recall"] > row["recall"] or other["p95"] < row["p95"])
+            for other in rows
+        )
+    return rows
+
+
+def tune(vectors: np.ndarray, m_values: list, ef_construction_values: list,
+         ef_search_values: list, k: int, n_queries: int,
+         seed: int = 0) -> tuple:
+    """Measure every parameter combination on held-out queries; returns
+    the rows and the k actually used.
+
+    n_queries embeddings are taken out of the corpus and used as queries,
+    so no query is trivially its own nearest neighbour."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    n_queries = min(n_queries, len(vectors) // 5)
+    queries, corpus = vectors[order[:n_queries]], vectors[order[n_queries:]]
+    k = min(k, len(corpus))
+    truth = exact_top_k(corpus, queries, k)
+    print(f"{len(corpus)} vectors, {n_queries} held-out queries, k={k}")
+
+    rows = []
+    workdir = tempfile.mkdtemp(prefix="partselect-hnsw-")
+    try:
+        for m in m_values:
+            for ef_construction in ef_construction_values:
+                path = os.path.join(workdir, f"m{m}-efc{ef_construction}")
+                build_s = build(path, corpus, m, ef_construction)
+                size = index_size(path)
+                for ef_search in ef_search_values:
+                    recall, p50, p95 = measure(path, queries, truth, k,
+                                               ef_search)
+                    rows.append({"m": m, "ef_construction": ef_construction,
+                                 "ef_search": ef_search, "recall": recall,
+                                 "p50": p50, "p95": p95, "build_s": build_s,
+                                 "size_mb": size / 2**20})
+                    print(f"  M={m} ef_construction={ef_construction} "
+                          f"ef_search={ef_search}: recall {recall:.3f}, "
+                          f"p95 {p95:.2f}ms")
+                shutil.rmtree(path, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return pareto(rows), k
+
+
+def print_table(rows: list, k: int):
+    current = (settings.HNSW_M, settings.HNSW_EF_CONSTRUCTION,
+               settings.HNSW_EF_SEARCH)
+    print(f"\n{'M':>4} {'ef_c':>5} {'ef_s':>5} {f'recall@{k}':>9} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'build s':>8} {'size MB':>8}")
+    for row in sorted(rows, key=lambda r: (-r["recall"], r["p95"])):
+        marks = (" *" if row["pareto"] else "") + (
+            "  <- current" if (row["m"], row["ef_construction"],
+                               row["ef_search"]) == current else "")
+        print(f"{row['m']:>4} {row['ef_construction']:>5} "
+              f"{row['ef_search']:>5} {row['recall']:>9.3f} "
+              f"{row['p50']:>7.2f} {row['p95']:>7.2f} "
+              f"{row['build_s']:>8.2f} {row['size_mb']:>8.1f}{marks}")
+    print("\n* Pareto-optimal: no other setting has both higher recall and "
+          "lower p95 latency.")
+
+
+def recommend(rows: list, target_recall: float) -> dict:
+    """The fastest Pareto-optimal row meeting the recall target, or else
+    the one with the best recall."""
+    frontier = [r for r in rows if r["pareto"]]
+    meeting = [r for r in frontier if r["recall"] >= target_recall]
+    if meeting:
+        return min(meeting, key=lambda r: (r["p95"], r["build_s"]))
+    return max(frontier, key=lambda r: r["recall"])
+
+
+def parse_ints(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collection",
+                        help="collection to read embeddings from "
+                             "(default: the active one)")
+    parser.add_argument("--m", type=parse_ints, default=[8, 16, 32])
+    parser.add_argument("--ef-construction", type=parse_ints,
+                        default=[50, 100, 200])
+    parser.add_argument("--ef-search", type=parse_ints,
+                        default=[10, 20, 50, 100, 200])
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_FETCH_K,
+                        help="neighbours per query (default: "
+                             "RETRIEVAL_FETCH_K)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Always measure the configured settings alongside the grid.
+    m_values = sorted(set(args.m) | {settings.HNSW_M})
+    ef_construction_values = sorted(set(args.ef_construction)
+                                    | {settings.HNSW_EF_CONSTRUCTION})
+    ef_search_values = sorted(set(args.ef_search) | {settings.HNSW_EF_SEARCH})
+
+    vectors = load_embeddings(args.collection)
+    if len(vectors) < 10:
+        sys.exit("Need at least 10 indexed embeddings to tune against.")
+    rows, k = tune(vectors, m_values, ef_construction_values,
+                   ef_search_values, args.k, args.queries, args.seed)
+    print_table(rows, k)
+
+    best = recommend(rows, args.target_recall)
+    print(f"\nSuggested for recall >= {args.target_recall:g}: "
+          f"HNSW_M={best['m']} "
+          f"HNSW_EF_CONSTRUCTION={best['ef_construction']} "
+          f"HNSW_EF_SEARCH={best['ef_search']} "
+          f"(recall {best['recall']:.3f}, p95 {best['p95']:.2f}ms). "
+          f"New values apply from the next build_index.")
+
+
+if __name__ == "__main__":
+    main()
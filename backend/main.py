@@ -1,8 +1,66 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from anyio import to_thread
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routers.chat import router as chat_router
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from config import settings
+from routers.admin import router as admin_router
+from routers.chat import (
+    router as chat_router, readiness, refresh_index, warm_up
+)
+from routers.models import router as models_router
+
+
+async def watch_index_pointer():
+    while True:
+        await asyncio.sleep(settings.INDEX_POINTER_POLL_SECONDS)
+        await asyncio.to_thread(refresh_index)
+
+
+async def warm_up_until_ready():
+    """Run warm_up, retrying with exponential backoff after a failure (a
+    locked session store, a slow disk) so one bad attempt does not leave
+    /ready at 503 for the life of the process."""
+    delay = 1.0
+    while True:
+        try:
+            await asyncio.to_thread(warm_up)
+            return
+        except Exception as e:
+            print(f"Warm-up failed, retrying in {delay:g}s: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.WARMUP_RETRY_MAX_SECONDS)
+
 
-app = FastAPI(title="PartSelect Chat Agent")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync endpoints and the RAG pipeline run in this pool; the chat
+    # in-flight limit must stay below it so shedding happens before a
+    # request queues for a thread.
+    to_thread.current_default_thread_limiter().total_tokens = (
+        settings.THREADPOOL_SIZE
+    )
+    if settings.CHAT_MAX_IN_FLIGHT >= settings.THREADPOOL_SIZE:
+        print(f"CHAT_MAX_IN_FLIGHT ({settings.CHAT_MAX_IN_FLIGHT}) should be "
+              f"below THREADPOOL_SIZE ({settings.THREADPOOL_SIZE})")
+    # Warm up off the event loop so the port binds immediately; /ready
+    # reports 503 until the services and index are loaded.
+    tasks = []
+    if settings.WARMUP_ON_STARTUP:
+        tasks.append(asyncio.create_task(warm_up_until_ready()))
+    else:
+        readiness["ready"] = True
+    # Pick up index versions published by build_index without a restart.
+    if settings.INDEX_POINTER_POLL_SECONDS > 0:
+        tasks.append(asyncio.create_task(watch_index_pointer()))
+    yield
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+
+
+app = FastAPI(title="PartSelect Chat Agent", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,11 +68,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 app.include_router(chat_router)
+app.include_router(models_router)
+app.include_router(admin_router)
 
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready(response: Response):
+    if readiness["ready"]:
+        return {"status": "ready"}
+    response.status_code = 503
+    if readiness["error"]:
+        return {"status": "failed", "error": readiness["error"]}
+    return {"status": "warming"}
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -2,10 +2,21 @@ from pydantic import BaseModel
 from typing import Optional, List
 
 
+class ConversationState(BaseModel):
+    ps_number: Optional[str] = None
+    model_number: Optional[str] = None
+    appliance_type: Optional[str] = None
+    intent: Optional[str] = None
+
+
 class ChatRequest(BaseModel):
     message: str
     conversation_history: Optional[List[dict]] = []
     page_url: Optional[str] = None
+    session_id: Optional[str] = None
+    use_session: bool = False
+    state: Optional[ConversationState] = None
+    debug: bool = False
 
 
 class PartCard(BaseModel):
@@ -23,3 +34,22 @@ class ChatResponse(BaseModel):
     content: str
     parts: Optional[List[PartCard]] = []
     suggested_queries: Optional[List[str]] = []
+    session_id: Optional[str] = None
+    state: Optional[ConversationState] = None
+    timings: Optional[dict] = None
+
+
+class ModelMatch(BaseModel):
+    model: str
+    appliance_types: List[str] = []
+    part_count: int = 0
+    distance: int = 0
+
+
+class ModelCompletionResponse(BaseModel):
+    prefix: str
+    matches: List[ModelMatch] = []
+
+
+class ActivateIndexRequest(BaseModel):
+    collection: str
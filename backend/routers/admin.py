@@ -0,0 +1,64 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from models.schemas import ActivateIndexRequest
+from routers.chat import flights, get_rag_service
+from services.vector_store import read_active_collection
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Admin endpoints are off unless ADMIN_TOKEN is set, and then need it
+    in the X-Admin-Token header."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(require_admin)])
+
+
+def _chroma_store():
+    store = get_rag_service().vector_store
+    if not hasattr(store, "activate"):
+        raise HTTPException(
+            status_code=409,
+            detail="Index versions are managed by the indexer for the "
+                   f"'{settings.VECTOR_BACKEND}' backend"
+        )
+    return store
+
+
+@router.get("/index")
+async def index_status():
+    store = _chroma_store()
+    return {
+        "serving": store.collection_name,
+        "pointer": read_active_collection(),
+        "versions": await run_in_threadpool(store.versions),
+    }
+
+
+@router.post("/index/activate")
+async def activate_index(request: ActivateIndexRequest):
+    """Validate a built collection and switch every worker to it."""
+    # chromadb is slow to import; the store has already loaded it.
+    from chromadb.errors import NotFoundError
+
+    store = _chroma_store()
+    try:
+        await run_in_threadpool(
+            get_rag_service().activate_index, request.collection
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"serving": store.collection_name}
+
+
+@router.get("/single-flight")
+async def single_flight_stats():
+    """Recent chat request keys and how often each was coalesced."""
+    return flights.stats()
@@ -1,27 +1,183 @@
-from fastapi import APIRouter, HTTPException
+import copy
+import functools
+import re
+import threading
+from fastapi import APIRouter, Header, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
+from config import settings
 from models.schemas import ChatRequest, ChatResponse
-from services.rag_service import RAGService
+from services.admission import Overloaded, chat_in_flight, limiters
+from services.guardrails import build_off_topic_response
+from services.metrics import RequestTimings, REQUEST_LATENCY
+from services.profiler import profile_call, profile_trigger
+from services.rag_service import RAGService, next_state
+from services.resilience import UpstreamUnavailable
+from services.session_store import SessionStore
+from services.single_flight import SingleFlight, flight_key
 
 router = APIRouter()
 rag_service = None
+session_store = None
+readiness = {"ready": False, "error": None}
+_init_lock = threading.Lock()
+flights = SingleFlight("chat", settings.SINGLE_FLIGHT_STATS_KEYS)
 
 
 def get_rag_service() -> RAGService:
     global rag_service
     if rag_service is None:
-        rag_service = RAGService()
+        with _init_lock:
+            if rag_service is None:
+                rag_service = RAGService()
     return rag_service
 
 
+def warm_up():
+    """Build the services, load the index and optionally pre-embed the
+    suggestion chips, so the first user after a deploy is not the one
+    paying for it."""
+    try:
+        service = get_rag_service()
+        service.vector_store.warm_up()
+        if settings.WARMUP_PREEMBED_QUERIES:
+            canned = list(build_off_topic_response()["suggested_queries"])
+            for intent in ["TROUBLESHOOT", "COMPATIBILITY_CHECK",
+                           "INSTALLATION_HELP", "GENERAL"]:
+                canned.extend(service._generate_suggestions(intent, {}))
+            service.embedding_service.preload(list(dict.fromkeys(canned)))
+        readiness["ready"], readiness["error"] = True, None
+    except Exception as e:
+        readiness["error"] = str(e)
+        raise
+
+
+def refresh_index():
+    """Follow the active-index pointer if the indexer has published a new
+    version. Called periodically by the app."""
+    if rag_service is None:
+        return
+    try:
+        rag_service.refresh_index()
+    except Exception as e:
+        print(f"Not switching vector index: {e}")
+
+
+def chat_flight_key(message: str, page_url: str, history: list,
+                    state: dict, trusted_state: bool = False) -> str:
+    """Requests with the same key get the same answer: the message up to
+    case and spacing, the PS number of the page being viewed, and the
+    history and state the pipeline will see, and where that state came
+    from."""
+    page_ps = re.search(r'PS(\d{5,})', page_url or "")
+    return flight_key(
+        " ".join(message.split()).casefold(),
+        page_ps.group(0) if page_ps else None,
+        history[-10:],
+        state,
+        trusted_state
+    )
+
+
+def get_session_store() -> SessionStore:
+    global session_store
+    if session_store is None:
+        session_store = SessionStore()
+    return session_store
+
+
 @router.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, response: Response,
+               x_profile_token: str = Header(None)):
+    timings = RequestTimings()
     try:
+        # Shed immediately rather than queueing behind a saturated provider.
+        limiters["chat"].check()
         service = get_rag_service()
-        result = await service.process_query(
-            message=request.message,
-            conversation_history=request.conversation_history or [],
-            page_url=request.page_url
+
+        # Session mode: history lives on the server and the client sends
+        # only the new message. A session this worker cannot find (expired,
+        # evicted, or held by another worker with no shared SESSION_DB_PATH)
+        # gets a 409; the client then starts a new session, sending its
+        # recent history once to seed it.
+        session_id = None
+        history = request.conversation_history or []
+        state = request.state.model_dump() if request.state else None
+        trusted_state = False
+        if request.session_id or request.use_session:
+            store = get_session_store()
+            session_id = request.session_id
+            if session_id and store.get(session_id) is None:
+                raise HTTPException(status_code=409, detail="session_lost")
+            if not session_id:
+                session_id = store.create()
+                seed = [{"role": t["role"], "content": t["content"]}
+                        for t in history[-store.max_turns:]
+                        if t.get("role") in ("user", "assistant")
+                        and isinstance(t.get("content"), str)]
+                if seed:
+                    store.append(session_id, *seed)
+            history = store.history(session_id)
+            if state is None:
+                state = store.state(session_id)
+                trusted_state = True
+
+        # Opt-in sampling profile of the pipeline; when not triggered the
+        # pipeline is called directly with nothing extra on the path.
+        trigger = profile_trigger(x_profile_token)
+        call = service.process_query
+        if trigger:
+            call = functools.partial(profile_call, trigger, call)
+
+        async def compute():
+            with chat_in_flight.hold():
+                return await run_in_threadpool(
+                    call,
+                    message=request.message,
+                    conversation_history=history,
+                    page_url=request.page_url,
+                    state=state,
+                    trusted_state=trusted_state
+                )
+
+        with timings.activate():
+            if settings.SINGLE_FLIGHT_ENABLED and not trigger:
+                # Identical concurrent requests (a suggestion chip clicked by
+                # many users) share one pipeline run; each gets its own copy.
+                result = copy.deepcopy(await flights.do(
+                    chat_flight_key(request.message, request.page_url,
+                                    history, state, trusted_state),
+                    compute, label=request.message[:80]
+                ))
+            else:
+                result = await compute()
+        turn = result.pop("turn", None) or {}
+        # Off-topic and mismatch replies resolve nothing new.
+        state = next_state(state, turn) if turn else state
+
+        if session_id:
+            get_session_store().append(
+                session_id,
+                {"role": "user", "content": request.message, **turn,
+                 "state": state},
+                {"role": "assistant", "content": result["content"]}
+            )
+
+        REQUEST_LATENCY.labels("ok").observe(timings.total())
+        response.headers["Server-Timing"] = timings.server_timing()
+        return ChatResponse(
+            **result,
+            session_id=session_id,
+            state=state,
+            timings=timings.as_dict() if request.debug else None
+        )
+    except HTTPException:
+        raise
+    except (Overloaded, UpstreamUnavailable) as e:
+        REQUEST_LATENCY.labels("overloaded").observe(timings.total())
+        raise HTTPException(
+            status_code=503, detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
-        return ChatResponse(**result)
     except Exception as e:
+        REQUEST_LATENCY.labels("error").observe(timings.total())
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+from models.schemas import ModelCompletionResponse
+from services.model_index import get_model_index
+
+router = APIRouter()
+
+
+@router.get("/api/models/complete", response_model=ModelCompletionResponse)
+def complete_models(
+    prefix: str = Query(..., min_length=1, max_length=40),
+    limit: int = Query(10, ge=1, le=50),
+    # Two edits can take tens of milliseconds on a long typo with few
+    # matches, too slow for keystrokes; one stays around a millisecond.
+    fuzzy: int = Query(0, ge=0, le=1,
+                       description="Maximum edits allowed for typos")
+):
+    """Model-number suggestions for a partially typed model, with the
+    appliance type each model belongs to."""
+    index = get_model_index()
+    if index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Model index not built; run python -m indexer.build_index"
+        )
+    return ModelCompletionResponse(
+        prefix=prefix,
+        matches=index.complete(prefix, limit=limit, max_edits=fuzzy)
+    )
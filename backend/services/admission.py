@@ -0,0 +1,119 @@
+import threading
+import time
+from contextlib import contextmanager
+from config import settings
+from services.metrics import (
+    CHAT_IN_FLIGHT, UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH,
+    UPSTREAM_QUEUE_WAIT, UPSTREAM_REJECTIONS
+)
+
+
+class Overloaded(Exception):
+    """Raised when an upstream has no capacity; maps to a 503."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: int = None):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after or settings.OVERLOAD_RETRY_AFTER
+        super().__init__(f"{upstream} is overloaded ({reason})")
+
+
+class UpstreamLimiter:
+    """Bounded concurrency for one upstream, with a bounded wait queue and a
+    deadline on time spent queued. Callers past either limit are rejected
+    immediately instead of piling up behind a rate-limited provider."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int,
+                 queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def saturated(self) -> bool:
+        return (self.active >= self.max_concurrency
+                and self.waiting >= self.max_queue)
+
+    def check(self):
+        """Shed before doing any work if the queue is already full."""
+        if self.saturated():
+            self._reject("queue_full")
+
+    def _reject(self, reason: str):
+        UPSTREAM_REJECTIONS.labels(self.name, reason).inc()
+        raise Overloaded(self.name, reason)
+
+    @contextmanager
+    def slot(self):
+        start = time.monotonic()
+        with self._cond:
+            if self.saturated():
+                self._reject("queue_full")
+            self.waiting += 1
+            UPSTREAM_QUEUE_DEPTH.labels(self.name).inc()
+            try:
+                while self.active >= self.max_concurrency:
+                    remaining = start + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        self._reject("queue_timeout")
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+                UPSTREAM_QUEUE_DEPTH.labels(self.name).dec()
+            self.active += 1
+        UPSTREAM_QUEUE_WAIT.labels(self.name).observe(time.monotonic() - start)
+        UPSTREAM_IN_FLIGHT.labels(self.name).inc()
+        try:
+            yield
+        finally:
+            UPSTREAM_IN_FLIGHT.labels(self.name).dec()
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+
+class InFlightLimit:
+    """Caps requests that hold, or are about to take, a worker thread.
+
+    Upstream slots are waited for inside worker threads, so once every
+    thread is waiting the per-upstream queues look fine while new requests
+    pile up with no deadline for Starlette's thread pool. This is checked
+    on the event loop before a thread is taken, and sized below the pool
+    (THREADPOOL_SIZE), so excess requests are shed at once instead."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self):
+        with self._lock:
+            if self.active >= self.limit:
+                UPSTREAM_REJECTIONS.labels(self.name, "in_flight_full").inc()
+                raise Overloaded(self.name, "in_flight_full")
+            self.active += 1
+        CHAT_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            CHAT_IN_FLIGHT.dec()
+            with self._lock:
+                self.active -= 1
+
+
+chat_in_flight = InFlightLimit("chat", settings.CHAT_MAX_IN_FLIGHT)
+
+limiters = {
+    name: UpstreamLimiter(name, max_concurrency, settings.UPSTREAM_MAX_QUEUE,
+                          settings.UPSTREAM_QUEUE_TIMEOUT)
+    for name, max_concurrency in [
+        ("embedding", settings.EMBEDDING_MAX_CONCURRENCY),
+        ("classify", settings.CLASSIFY_MAX_CONCURRENCY),
+        ("chat", settings.CHAT_MAX_CONCURRENCY),
+    ]
+}
@@ -0,0 +1,232 @@
+import bisect
+import json
+import os
+import re
+import numpy as np
+from services.packed import (
+    PackedStrings, dictionary_encode, staged_directory
+)
+
+# Free-text fields, each stored as one packed UTF-8 column.
+TEXT_FIELDS = ["ps_number", "name", "price", "description", "oem_part_number",
+               "image_url", "source_url", "installation_instructions",
+               "symptoms_fixed", "repair_rating"]
+# Low-cardinality fields, stored as int16 codes into a sorted vocabulary.
+CATEGORY_FIELDS = ["appliance_type", "brand"]
+# Optional booleans, stored as int8: -1 missing, 0 false, 1 true.
+FLAG_FIELDS = ["in_stock", "has_video"]
+# Model numbers are letters and digits, so a newline never occurs in one.
+MODEL_SEPARATOR = "\n"
+KNOWN_FIELDS = set(TEXT_FIELDS + CATEGORY_FIELDS + FLAG_FIELDS
+                   + ["compatible_models"])
+
+_BRAND_FROM_URL = re.compile(r"/PS\d+-([A-Za-z]+)-")
+
+
+def brand_of(part: dict) -> str:
+    """The part's brand, from the record or else its PartSelect URL."""
+    if part.get("brand"):
+        return part["brand"]
+    match = _BRAND_FROM_URL.search(part.get("source_url") or "")
+    return match.group(1) if match else ""
+
+
+def write_catalog(path: str, parts) -> int:
+    """Write parts (scraper-shaped dicts) as a columnar catalog directory.
+
+    Each part's compatible_models list is packed into one blob entry with
+    a separator byte, so reading it back is one decode and a split rather
+    than one object per model. Fields the format does not know
+    are kept as per-part JSON so the conversion is lossless."""
+    parts = list(parts)
+    with staged_directory(path) as staging:
+        def column(name: str) -> str:
+            return os.path.join(staging, name)
+
+        for field in TEXT_FIELDS:
+            PackedStrings.write(column(field),
+                                (str(p.get(field) or "") for p in parts))
+        for field in CATEGORY_FIELDS:
+            values = ([brand_of(p) for p in parts] if field == "brand"
+                      else [str(p.get(field) or "") for p in parts])
+            codes, vocabulary = dictionary_encode(values)
+            np.save(column(f"{field}.npy"), codes.astype(np.int16))
+            PackedStrings.write(column(f"{field}.vocab"), vocabulary)
+        for field in FLAG_FIELDS:
+            np.save(column(f"{field}.npy"), np.asarray(
+                [-1 if p.get(field) is None else int(bool(p[field]))
+                 for p in parts], dtype=np.int8))
+
+        PackedStrings.write(column("compatible_models"), (
+            MODEL_SEPARATOR.join(p.get("compatible_models") or [])
+            for p in parts
+        ))
+
+        np.save(column("ps_order.npy"), np.argsort(
+            [str(p.get("ps_number") or "") for p in parts], kind="stable"
+        ).astype(np.int32))
+        PackedStrings.write(column("extra"), (
+            json.dumps({k: v for k, v in p.items() if k not in KNOWN_FIELDS})
+            if set(p) - KNOWN_FIELDS else "" for p in parts
+        ))
+
+        with open(column("manifest.json"), "w") as f:
+            json.dump({"count": len(parts), "text_fields": TEXT_FIELDS,
+                       "category_fields": CATEGORY_FIELDS,
+                       "flag_fields": FLAG_FIELDS}, f)
+    return len(parts)
+
+
+class Part:
+    """Read-only view of one catalog row.
+
+    Holds only the catalog and a row number; each field is read from the
+    mapped columns when asked for. Supports the dict reads the indexer
+    uses (get, [], in), so it can stand in for a parts.jsonl record."""
+
+    __slots__ = ("catalog", "row")
+
+    def __init__(self, catalog: "Catalog", row: int):
+        self.catalog = catalog
+        self.row = row
+
+    def get(self, field: str, default=None):
+        value = self.catalog.value(self.row, field)
+        return default if value is None else value
+
+    def __getitem__(self, field: str):
+        value = self.catalog.value(self.row, field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field: str) -> bool:
+        return self.catalog.value(self.row, field) is not None
+
+    def keys(self) -> list:
+        extra = self.catalog.extra[self.row]
+        return ([f for f in self.catalog.fields if f in self]
+                + (list(json.loads(extra)) if extra else []))
+
+    def to_dict(self) -> dict:
+        return {f: self[f] for f in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"Part({self.get('ps_number')!r})"
+
+
+class Catalog:
+    """Memory-mapped reader for a catalog written by write_catalog.
+
+    Opening it maps files rather than parsing records, so load time and
+    resident memory stay small however large the catalog is, and worker
+    processes share the same pages."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+
+        def load(name: str):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.text = {field: PackedStrings.load(os.path.join(path, field))
+                     for field in self.manifest["text_fields"]}
+        # Vocabularies are tiny, so they are held as Python lists.
+        self.categories = {
+            field: (load(f"{field}.npy"), list(PackedStrings.load(
+                os.path.join(path, f"{field}.vocab"))))
+            for field in self.manifest["category_fields"]
+        }
+        self.flags = {field: load(f"{field}.npy")
+                      for field in self.manifest["flag_fields"]}
+        self.models = PackedStrings.load(
+            os.path.join(path, "compatible_models"))
+        self.ps_order = load("ps_order.npy")
+        self.extra = PackedStrings.load(os.path.join(path, "extra"))
+        self.fields = (list(self.text) + list(self.categories)
+                       + list(self.flags) + ["compatible_models"])
+        self._readers = {field: self._text_reader(field)
+                         for field in self.text}
+        self._readers.update({field: self._category_reader(field)
+                              for field in self.categories})
+        self._readers.update({field: self._flag_reader(field)
+                              for field in self.flags})
+        self._readers["compatible_models"] = self._models_reader()
+
+    def _text_reader(self, field: str):
+        column = self.text[field]
+        return lambda row: column[row] or None
+
+    def _category_reader(self, field: str):
+        codes, vocabulary = self.categories[field]
+        return lambda row: vocabulary[codes[row]] or None
+
+    def _flag_reader(self, field: str):
+        flags = memoryview(self.flags[field])
+        return lambda row: None if flags[row] < 0 else flags[row] == 1
+
+    def _models_reader(self):
+        column = self.models
+
+        def read(row: int):
+            models = column[row]
+            return models.split(MODEL_SEPARATOR) if models else None
+        return read
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def __getitem__(self, row: int) -> Part:
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return Part(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield Part(self, row)
+
+    def value(self, row: int, field: str):
+        """One field of one row, or None if the part does not have it."""
+        reader = self._readers.get(field)
+        if reader is not None:
+            return reader(row)
+        extra = self.extra[row]
+        return json.loads(extra).get(field) if extra else None
+
+    def find(self, ps_number: str) -> Part:
+        """The part with this PS number, or None."""
+        numbers = self.text["ps_number"]
+        position = bisect.bisect_left(
+            range(len(self)), ps_number,
+            key=lambda i: numbers[int(self.ps_order[i])]
+        )
+        if position < len(self):
+            row = int(self.ps_order[position])
+            if numbers[row] == ps_number:
+                return Part(self, row)
+        return None
+
+    def category_rows(self, field: str, value: str) -> np.ndarray:
+        """Rows whose category field equals value, as a vectorised scan."""
+        codes, vocabulary = self.categories[field]
+        if value not in vocabulary:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(codes == vocabulary.index(value))
+
+
+def is_catalog(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "manifest.json"))
+
+
+def open_parts(path: str):
+    """Parts from a catalog directory, or parsed from a parts.jsonl file."""
+    if is_catalog(path):
+        return Catalog(path)
+    parts = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                parts.append(json.loads(line))
+    return parts
@@ -0,0 +1,96 @@
+import numpy as np
+from config import settings
+from services.metrics import record_context
+from services.packed import normalize_rows
+
+# Which chunk of a part best answers each intent, most useful first.
+CHUNK_PRIORITY = {
+    "COMPATIBILITY_CHECK": ["compatibility", "overview", "installation"],
+    "INSTALLATION_HELP": ["installation", "overview", "compatibility"],
+    "TROUBLESHOOT": ["overview", "installation", "compatibility"],
+    "PART_LOOKUP": ["overview", "compatibility", "installation"],
+    "GENERAL": ["overview", "compatibility", "installation"],
+}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose and part numbers.
+    return len(text) // 4 + 1
+
+
+def diversify(results: dict, query_embedding: list, intent: str,
+              max_chunks: int = None, token_budget: int = None) -> dict:
+    """Trim an over-fetched search result to a small, varied context.
+
+    1. Collapse each part to its CHUNKS_PER_PART most useful chunks, ranked
+       by CHUNK_PRIORITY for the intent and then by relevance. Results for
+       a single part keep all of its chunks in that order.
+    2. Pick chunks by maximal marginal relevance, skipping any that are
+       near-duplicates of a chunk already picked (sibling parts often share
+       an almost identical overview).
+    3. Stop at max_chunks or when the next chunk would exceed the token
+       budget.
+
+    Takes and returns Chroma-shaped results; needs "embeddings" in them.
+    Results without embeddings are returned unchanged."""
+    max_chunks = max_chunks or settings.MAX_CONTEXT_CHUNKS
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    embeddings = results.get("embeddings") if results else None
+    if embeddings is None or not len(embeddings) or not len(embeddings[0]):
+        return results
+
+    documents = results["documents"][0]
+    metadatas = results["metadatas"][0]
+    vectors = normalize_rows(np.asarray(embeddings[0], dtype=np.float32))
+    query = normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+    relevance = vectors @ query
+
+    priority = CHUNK_PRIORITY.get(intent, CHUNK_PRIORITY["GENERAL"])
+
+    def rank(i: int) -> tuple:
+        chunk_type = metadatas[i].get("chunk_type")
+        order = (priority.index(chunk_type) if chunk_type in priority
+                 else len(priority))
+        return order, -relevance[i]
+
+    by_part = {}
+    for i, meta in enumerate(metadatas):
+        by_part.setdefault(meta.get("ps_number") or f"#{i}", []).append(i)
+    per_part = settings.CHUNKS_PER_PART if len(by_part) > 1 else max_chunks
+    candidates = [i for rows in by_part.values()
+                  for i in sorted(rows, key=rank)[:per_part]]
+
+    if len(by_part) == 1:
+        # One part: the intent's preferred chunk order is the answer order.
+        ordered = candidates
+    else:
+        ordered = []
+        remaining = list(candidates)
+        redundancy = np.zeros(len(documents), dtype=np.float32)
+        while remaining:
+            scores = [settings.MMR_LAMBDA * relevance[i]
+                      - (1 - settings.MMR_LAMBDA) * redundancy[i]
+                      for i in remaining]
+            best = remaining.pop(int(np.argmax(scores)))
+            duplicate = redundancy[best] >= settings.NEAR_DUPLICATE_SIMILARITY
+            if ordered and duplicate:
+                continue
+            ordered.append(best)
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+
+    kept, used = [], 0
+    for i in ordered:
+        if len(kept) >= max_chunks:
+            break
+        cost = estimate_tokens(documents[i])
+        if kept and used + cost > token_budget:
+            continue
+        kept.append(i)
+        used += cost
+    record_context(len(documents), len(kept), used)
+
+    trimmed = {key: [[values[0][i] for i in kept]]
+               for key, values in results.items()
+               if key in ("ids", "documents", "metadatas", "distances")
+               and values}
+    return trimmed
@@ -1,22 +1,93 @@
-from openai import OpenAI
+import os
 from config import settings
+from services.admission import limiters
+from services.providers import create_openai_client
+from services.resilience import callers
 
 
-class EmbeddingService:
+class OpenAIEmbeddingProvider:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = create_openai_client()
         self.model = settings.OPENAI_EMBEDDING_MODEL
+        self.model_name = f"openai:{self.model}"
 
-    def embed(self, text: str) -> list:
-        response = self.client.embeddings.create(
-            input=text,
-            model=self.model
-        )
-        return response.data[0].embedding
+    def embed_batch(self, texts: list) -> list:
+        with limiters["embedding"].slot():
+            response = callers["embedding"].call(
+                lambda timeout: self.client.embeddings.create(
+                    input=texts,
+                    model=self.model,
+                    timeout=timeout
+                )
+            )
+        return [d.embedding for d in response.data]
+
+
+class LocalEmbeddingProvider:
+    """In-process embedder loaded from the artifact written by build_index."""
+
+    def __init__(self, path: str = None):
+        from services.local_embedding import HashingSVDEmbedder
+
+        self.path = path or settings.LOCAL_EMBEDDING_PATH
+        self.model = HashingSVDEmbedder.load(self.path)
+        self.model_name = self.model.model_name
 
     def embed_batch(self, texts: list) -> list:
-        response = self.client.embeddings.create(
-            input=texts,
-            model=self.model
+        return self.model.embed_batch(texts)
+
+
+EMBEDDING_PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": LocalEmbeddingProvider,
+}
+
+
+def create_embedding_provider(name: str = None):
+    name = name or settings.EMBEDDING_PROVIDER
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(
+            f"Unknown EMBEDDING_PROVIDER '{name}', expected one of "
+            f"{sorted(EMBEDDING_PROVIDERS)}"
         )
-        return [d.embedding for d in response.data]
+    return EMBEDDING_PROVIDERS[name]()
+
+
+class EmbeddingService:
+    def __init__(self, provider=None):
+        self.provider = provider or create_embedding_provider()
+        self.model_name = self.provider.model_name
+        self._preloaded = {}
+
+    def preload(self, texts: list):
+        """Embed known queries ahead of time (e.g. suggestion chips)."""
+        for text, embedding in zip(texts, self.provider.embed_batch(texts)):
+            self._preloaded[text] = embedding
+
+    def embed(self, text: str) -> list:
+        if text in self._preloaded:
+            return self._preloaded[text]
+        return self.provider.embed_batch([text])[0]
+
+    def embed_batch(self, texts: list) -> list:
+        return self.provider.embed_batch(texts)
+
+
+def local_embedder_path(version: str) -> str:
+    """Where build_index saves the local embedder trained for an index
+    version: LOCAL_EMBEDDING_PATH with the version before the extension."""
+    root, ext = os.path.splitext(settings.LOCAL_EMBEDDING_PATH)
+    return f"{root}.{version}{ext}"
+
+
+def embedding_service_for(artifact: str = None,
+                          current: EmbeddingService = None) -> EmbeddingService:
+    """The embedding service for queries against an index that recorded
+    artifact as its local embedder (LOCAL_EMBEDDING_PATH for indexes that
+    recorded none). current is reused when it already embeds that way."""
+    if settings.EMBEDDING_PROVIDER != "local":
+        return current or EmbeddingService()
+    path = artifact or settings.LOCAL_EMBEDDING_PATH
+    if current is not None and getattr(current.provider, "path", None) == path:
+        return current
+    return EmbeddingService(LocalEmbeddingProvider(path))
@@ -28,6 +28,19 @@ def quick_topic_check(message: str) -> str:
     return "UNCERTAIN"
 
 
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|it's|this|that|these|those|them|they|the part|same)\b"
+    r"|^\s*(and|also|what about|how about)\b",
+    re.IGNORECASE
+)
+
+
+def is_follow_up(message: str) -> bool:
+    """Whether a message refers back to something from an earlier turn
+    ("how do I install it?", "what about the price?")."""
+    return bool(FOLLOW_UP_PATTERN.search(message))
+
+
 def build_off_topic_response() -> dict:
     return {
         "role": "assistant",
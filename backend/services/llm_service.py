@@ -1,29 +1,42 @@
-from openai import OpenAI
 from config import settings
+from services.admission import limiters
+from services.providers import create_openai_client
+from services.resilience import callers
+from services.metrics import record_tokens
 
 
 class LLMService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = create_openai_client()
         self.model = settings.OPENAI_MODEL
 
     def chat(self, system_prompt: str, messages: list) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                *messages
-            ],
-            temperature=0.1,
-            max_tokens=1024
-        )
+        with limiters["chat"].slot():
+            response = callers["chat"].call(
+                lambda timeout: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        *messages
+                    ],
+                    temperature=0.1,
+                    max_tokens=1024,
+                    timeout=timeout
+                )
+            )
+        record_tokens(self.model, response.usage)
         return response.choices[0].message.content
 
     def classify(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=20
-        )
+        with limiters["classify"].slot():
+            response = callers["classify"].call(
+                lambda timeout: self.client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0,
+                    max_tokens=20,
+                    timeout=timeout
+                )
+            )
+        record_tokens("gpt-3.5-turbo", response.usage)
         return response.choices[0].message.content.strip()
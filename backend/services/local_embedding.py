@@ -0,0 +1,135 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingSVDEmbedder:
+    """CPU-only text embedder: hashed TF-IDF features reduced with a
+    truncated SVD (LSA) fitted on our own chunk corpus.
+
+    Embedding a query is a hash, a sparse gather and a small matrix-vector
+    product, so it runs in well under a millisecond with no network hop."""
+
+    def __init__(self, components: np.ndarray = None, idf: np.ndarray = None,
+                 n_features: int = 2 ** 15):
+        self.n_features = n_features
+        # Stored feature-major (n_features x dim) so a query only gathers
+        # the rows for the tokens it contains.
+        self.components = components
+        self.idf = idf
+        self._model_name = None
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def model_name(self) -> str:
+        # Fingerprint the fitted weights: an index built with one fit is not
+        # searchable with vectors from another.
+        if self._model_name is None:
+            digest = hashlib.sha1(self.components.tobytes()).hexdigest()[:10]
+            self._model_name = f"local:hashing-svd-{self.dim}-{digest}"
+        return self._model_name
+
+    def _features(self, text: str) -> tuple:
+        """Signed hashed counts of unigrams and bigrams."""
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for term in terms:
+            h = zlib.crc32(term.encode())
+            index = h % self.n_features
+            sign = 1.0 if h & 0x80000000 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign
+        # Signed collisions can cancel out; drop the empty buckets.
+        counts = {i: c for i, c in counts.items() if c != 0}
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32,
+                             count=len(counts))
+        # Sublinear term frequency keeps long chunks from dominating.
+        values = np.sign(values) * (1.0 + np.log(np.abs(values)))
+        return indices, values
+
+    def _tfidf(self, text: str) -> tuple:
+        indices, values = self._features(text)
+        values = values * self.idf[indices]
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values = values / norm
+        return indices, values
+
+    def fit(self, texts: list, dim: int = 256, oversample: int = 10,
+            power_iterations: int = 2, seed: int = 0):
+        """Fit IDF weights and a randomized truncated SVD on the corpus."""
+        rows = [self._features(text) for text in texts]
+
+        df = np.zeros(self.n_features, dtype=np.float64)
+        for indices, _ in rows:
+            df[indices] += 1
+        n_docs = len(rows)
+        self.idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+        rows = [self._tfidf(text) for text in texts]
+
+        rank = min(dim, n_docs, self.n_features)
+        width = min(rank + oversample, n_docs, self.n_features)
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((self.n_features, width)).astype(np.float32)
+
+        y = self._matmul(rows, omega)
+        for _ in range(power_iterations):
+            y, _ = np.linalg.qr(y)
+            y = self._matmul(rows, self._rmatmul(rows, y))
+        q, _ = np.linalg.qr(y)
+
+        b = self._rmatmul(rows, q).T
+        _, _, vt = np.linalg.svd(b, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+        self._model_name = None
+        return self
+
+    @staticmethod
+    def _matmul(rows: list, dense: np.ndarray) -> np.ndarray:
+        """X @ dense, for X given as sparse rows."""
+        out = np.zeros((len(rows), dense.shape[1]), dtype=np.float32)
+        for i, (indices, values) in enumerate(rows):
+            if len(indices):
+                out[i] = values @ dense[indices]
+        return out
+
+    def _rmatmul(self, rows: list, dense: np.ndarray) -> np.ndarray:
+        """X.T @ dense, for X given as sparse rows."""
+        out = np.zeros((self.n_features, dense.shape[1]), dtype=np.float32)
+        for i, (indices, values) in enumerate(rows):
+            if len(indices):
+                out[indices] += np.outer(values, dense[i])
+        return out
+
+    def embed(self, text: str) -> list:
+        indices, values = self._tfidf(text)
+        vector = values @ self.components[indices]
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        else:
+            vector[0] = 1.0
+        return vector.tolist()
+
+    def embed_batch(self, texts: list) -> list:
+        return [self.embed(text) for text in texts]
+
+    def save(self, path: str):
+        np.savez(path, components=self.components, idf=self.idf,
+                 n_features=np.array(self.n_features))
+
+    @classmethod
+    def load(cls, path: str) -> "HashingSVDEmbedder":
+        data = np.load(path)
+        return cls(components=data["components"], idf=data["idf"],
+                   n_features=int(data["n_features"]))
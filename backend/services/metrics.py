@@ -0,0 +1,228 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+REQUEST_LATENCY = Histogram(
+    "chat_request_seconds", "End-to-end /api/chat latency",
+    ["outcome"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "chat_stage_seconds", "Latency of each RAG pipeline stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+GUARDRAIL_DECISIONS = Counter(
+    "chat_guardrail_decisions_total", "Topic guardrail outcomes",
+    ["decision"]
+)
+VECTOR_SEARCHES = Counter(
+    "chat_vector_searches_total", "Vector store searches by filter",
+    ["filter"]
+)
+SEARCHES_PER_REQUEST = Histogram(
+    "chat_vector_searches_per_request", "Vector searches issued per request",
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10)
+)
+RETRIEVAL_TIER = Counter(
+    "chat_retrieval_tier_total", "Retrieval tier that produced the context",
+    ["tier"]
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens consumed by upstream model calls",
+    ["model", "kind"]
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "upstream_in_flight", "Upstream calls currently executing", ["upstream"]
+)
+CHAT_IN_FLIGHT = Gauge(
+    "chat_requests_in_flight", "Chat pipeline runs holding a worker thread"
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "upstream_queue_depth", "Calls waiting for an upstream slot", ["upstream"]
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "upstream_queue_wait_seconds", "Time spent waiting for an upstream slot",
+    ["upstream"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_REJECTIONS = Counter(
+    "upstream_rejections_total", "Calls shed by admission control",
+    ["upstream", "reason"]
+)
+UPSTREAM_CALLS = Counter(
+    "upstream_calls_total", "Upstream call attempts by outcome",
+    ["upstream", "outcome"]
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total", "Retried upstream calls", ["upstream"]
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedges_total", "Hedged duplicate upstream requests", ["upstream"]
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state", "Circuit breaker state (0 closed, 1 open, "
+    "2 half-open)", ["upstream"]
+)
+DEGRADED_RESPONSES = Counter(
+    "chat_degraded_responses_total", "Responses served without an upstream",
+    ["upstream"]
+)
+CONTEXT_CHUNKS = Histogram(
+    "chat_context_chunks", "Retrieved chunks sent to the LLM",
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+CONTEXT_TOKENS = Histogram(
+    "chat_context_tokens", "Estimated prompt tokens of retrieved context",
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000)
+)
+INDEX_SWAPS = Counter(
+    "vector_index_swaps_total", "Times the server switched index versions"
+)
+FAST_PATH_HITS = Counter(
+    "chat_fast_path_hits_total", "Queries answered without the LLM",
+    ["question"]
+)
+STATE_CARRIED = Counter(
+    "chat_state_carried_total", "Entities reused from earlier turns",
+    ["field"]
+)
+PROFILES_CAPTURED = Counter(
+    "chat_profiles_captured_total", "Request profiles written", ["trigger"]
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total", "Coalesced calls by role (leader computed, "
+    "follower shared its result, error failed every waiter)",
+    ["flight", "role"]
+)
+SINGLE_FLIGHT_IN_FLIGHT = Gauge(
+    "single_flight_in_flight", "Distinct keys currently computing", ["flight"]
+)
+
+_current_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Per-request stage timings and pipeline attributes.
+
+    Spans are also observed into the Prometheus histograms, so the same
+    measurements feed both the per-request breakdown and /metrics."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.searches = []
+        self.attributes = {}
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+            STAGE_LATENCY.labels(stage).observe(elapsed)
+
+    @contextmanager
+    def activate(self):
+        token = _current_timings.set(self)
+        try:
+            yield self
+        finally:
+            _current_timings.reset(token)
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Format the stages as a Server-Timing header value (milliseconds)."""
+        entries = [f"{stage};dur={secs * 1000:.1f}"
+                   for stage, secs in self.stages.items()]
+        entries.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round(self.total() * 1000, 2),
+            "stages_ms": {stage: round(secs * 1000, 2)
+                          for stage, secs in self.stages.items()},
+            "searches": list(self.searches),
+            **self.attributes
+        }
+
+
+def current_timings() -> RequestTimings:
+    return _current_timings.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage against the active request, if there is one."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.span(stage):
+        yield
+
+
+def set_attribute(key: str, value):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.attributes[key] = value
+
+
+def record_guardrail(decision: str):
+    GUARDRAIL_DECISIONS.labels(decision).inc()
+    set_attribute("guardrail", decision)
+
+
+def record_search(where: dict):
+    label = describe_filter(where)
+    VECTOR_SEARCHES.labels(label).inc()
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.searches.append(label)
+
+
+def record_retrieval_tier(tier: str):
+    RETRIEVAL_TIER.labels(tier).inc()
+    set_attribute("retrieval_tier", tier)
+
+
+def record_context(candidates: int, chunks: int, tokens: int):
+    CONTEXT_CHUNKS.observe(chunks)
+    CONTEXT_TOKENS.observe(tokens)
+    set_attribute("context", {"candidates": candidates, "chunks": chunks,
+                              "tokens": tokens})
+
+
+def record_tokens(model: str, usage):
+    if usage is None:
+        return
+    LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+    timings = _current_timings.get()
+    if timings is not None:
+        tokens = timings.attributes.setdefault(
+            "tokens", {"prompt": 0, "completion": 0}
+        )
+        tokens["prompt"] += usage.prompt_tokens or 0
+        tokens["completion"] += usage.completion_tokens or 0
+
+
+def describe_filter(where: dict) -> str:
+    """Reduce a Chroma where-clause to a low-cardinality label."""
+    if not where:
+        return "none"
+    keys = []
+    for key, value in where.items():
+        if key.startswith("$") and isinstance(value, list):
+            keys.extend(describe_filter(clause) for clause in value)
+        else:
+            keys.append(key)
+    return "+".join(sorted(keys))
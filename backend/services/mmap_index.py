@@ -0,0 +1,282 @@
+import json
+import os
+import shutil
+import time
+import numpy as np
+from config import settings
+from services.metrics import INDEX_SWAPS, span, record_search
+from services.packed import PackedStrings, dictionary_encode, normalize_rows
+from services.vector_store import write_pointer
+
+# Metadata fields the retrieval filters use; stored as dictionary-encoded
+# int32 columns so a where-clause is a vectorised mask, not a JSON decode.
+FILTER_FIELDS = ["ps_number", "oem_part_number", "appliance_type",
+                 "chunk_type"]
+# File in MMAP_INDEX_PATH naming the version directory servers should map.
+ACTIVE_POINTER = "ACTIVE_VERSION"
+
+
+def read_active_version(path: str) -> str:
+    """The version directory the pointer in path names, or "" for an index
+    exported before versioning, with its files directly in path."""
+    try:
+        with open(os.path.join(path, ACTIVE_POINTER)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def write_mmap_index(path: str, ids: list, documents: list,
+                     embeddings: list, metadatas: list,
+                     embedding_model: str = None,
+                     embedding_artifact: str = None) -> str:
+    """Write a read-only index as a new version directory under path and
+    point servers at it. Returns the version.
+
+    The version is complete before the pointer names it, so readers never
+    see a partial index. The version it replaces is kept for servers that
+    have not switched yet; older ones are removed. Deleting files does not
+    affect servers that still have them mapped."""
+    os.makedirs(path, exist_ok=True)
+    base = time.strftime("v%Y%m%d%H%M%S")
+    version, n = base, 1
+    while os.path.exists(os.path.join(path, version)):
+        n += 1
+        version = f"{base}-{n}"
+    staging = os.path.join(path, f".{version}.tmp-{os.getpid()}")
+    os.makedirs(staging)
+
+    vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    np.save(os.path.join(staging, "vectors.npy"), vectors)
+
+    PackedStrings.write(os.path.join(staging, "ids"), ids)
+    PackedStrings.write(os.path.join(staging, "documents"), documents)
+    PackedStrings.write(os.path.join(staging, "metadata"),
+                        (json.dumps(m) for m in metadatas))
+    for field in FILTER_FIELDS:
+        codes, vocabulary = dictionary_encode(
+            [str(m.get(field, "")) for m in metadatas]
+        )
+        np.save(os.path.join(staging, f"col_{field}.npy"), codes)
+        PackedStrings.write(os.path.join(staging, f"col_{field}.vocab"),
+                            vocabulary)
+
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump({
+            "count": len(ids),
+            "dim": int(vectors.shape[1]) if len(ids) else 0,
+            "embedding_model": embedding_model,
+            "embedding_artifact": embedding_artifact,
+            "filter_fields": FILTER_FIELDS,
+        }, f)
+
+    os.rename(staging, os.path.join(path, version))
+    previous = read_active_version(path)
+    write_pointer(os.path.join(path, ACTIVE_POINTER), version)
+
+    for name in os.listdir(path):
+        # Staging directories start with "."; files directly in path are
+        # an unversioned index, kept only while it is the previous one.
+        if name in (version, previous, ACTIVE_POINTER) or name.startswith("."):
+            continue
+        full = os.path.join(path, name)
+        if os.path.isdir(full):
+            shutil.rmtree(full, ignore_errors=True)
+        elif previous:
+            os.remove(full)
+    return version
+
+
+class MmapIndex:
+    """One read-only index version backed by memory-mapped files.
+
+    Vectors, ids, documents, metadata and filter columns are all mapped from
+    disk, so uvicorn workers share one copy through the page cache and
+    resident memory stays roughly flat as workers are added. Search is an
+    exact cosine scan over the (optionally filtered) rows."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(self.path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(self.path, "vectors.npy"),
+                               mmap_mode="r")
+        self.ids = PackedStrings.load(os.path.join(self.path, "ids"))
+        self.documents = PackedStrings.load(
+            os.path.join(self.path, "documents"))
+        self.metadata = PackedStrings.load(
+            os.path.join(self.path, "metadata"))
+        self.columns = {}
+        for field in self.manifest["filter_fields"]:
+            self.columns[field] = (
+                np.load(os.path.join(self.path, f"col_{field}.npy"),
+                        mmap_mode="r"),
+                PackedStrings.load(
+                    os.path.join(self.path, f"col_{field}.vocab"))
+            )
+
+    @property
+    def embedding_model(self) -> str:
+        return self.manifest.get("embedding_model")
+
+    @property
+    def embedding_artifact(self) -> str:
+        return self.manifest.get("embedding_artifact")
+
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    def warm_up(self):
+        # Touch every page once so the first query does not fault them in.
+        if self.count():
+            float(self.vectors.sum())
+
+    def _mask(self, where: dict) -> np.ndarray:
+        """Evaluate a Chroma-style where-clause against the filter columns."""
+        masks = []
+        for key, value in where.items():
+            if key in ("$and", "$or"):
+                clauses = [self._mask(clause) for clause in value]
+                combine = np.logical_and if key == "$and" else np.logical_or
+                masks.append(combine.reduce(clauses))
+                continue
+            if key not in self.columns:
+                raise ValueError(f"Cannot filter on '{key}' in the mmap "
+                                 f"index; indexed fields: {FILTER_FIELDS}")
+            if isinstance(value, dict):
+                if set(value) != {"$eq"}:
+                    raise ValueError(f"Unsupported operator in {value}")
+                value = value["$eq"]
+            codes, vocabulary = self.columns[key]
+            code = vocabulary.find(str(value))
+            if code < 0:
+                masks.append(np.zeros(self.count(), dtype=bool))
+            else:
+                masks.append(codes == code)
+        return np.logical_and.reduce(masks)
+
+    def _rows(self, where: dict):
+        if not where:
+            return None
+        return np.flatnonzero(self._mask(where))
+
+    def search(self, query_embedding: list, n_results: int = 5,
+               where: dict = None, include_embeddings: bool = False) -> dict:
+        record_search(where)
+        with span("vector_search"):
+            query = normalize_rows(np.asarray(query_embedding,
+                                              dtype=np.float32))
+
+            rows = self._rows(where)
+            if rows is None:
+                scores = self.vectors @ query
+            else:
+                scores = self.vectors[rows] @ query
+
+            k = min(n_results, len(scores))
+            if k == 0:
+                top = np.zeros(0, dtype=np.int64)
+            else:
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+            hits = rows[top] if rows is not None else top
+
+            results = {
+                "ids": [[self.ids[i] for i in hits]],
+                "documents": [[self.documents[i] for i in hits]],
+                "metadatas": [[json.loads(self.metadata[i]) for i in hits]],
+                "distances": [[float(1.0 - scores[t]) for t in top]],
+            }
+            if include_embeddings:
+                results["embeddings"] = [np.asarray(self.vectors[hits])]
+            return results
+
+    def get_metadatas(self, where: dict, limit: int = 1) -> list:
+        record_search(where)
+        with span("vector_search"):
+            rows = self._rows(where)
+            if rows is None:
+                rows = np.arange(self.count())
+            return [json.loads(self.metadata[i]) for i in rows[:limit]]
+
+    def get_documents(self, where: dict, limit: int = 1) -> dict:
+        record_search(where)
+        with span("vector_search"):
+            rows = self._rows(where)
+            if rows is None:
+                rows = np.arange(self.count())
+            rows = rows[:limit]
+            return {
+                "documents": [self.documents[i] for i in rows],
+                "metadatas": [json.loads(self.metadata[i]) for i in rows],
+            }
+
+
+class MmapVectorStore:
+    """Read-only VectorStore serving the mmap index version the pointer in
+    MMAP_INDEX_PATH names.
+
+    refresh maps a newly published version and swaps it in between
+    queries; queries already running finish on the version they started
+    with."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.MMAP_INDEX_PATH
+        self.version = read_active_version(self.path)
+        self.index = MmapIndex(os.path.join(self.path, self.version))
+        self._rejected = None
+
+    def refresh(self, load_embedder=None):
+        """Switch to the version the pointer names, if it changed. Returns
+        the embedding service load_embedder gives for the new version, or
+        None without a switch."""
+        version = read_active_version(self.path)
+        if version in (self.version, self._rejected):
+            return None
+        try:
+            index = MmapIndex(os.path.join(self.path, version))
+            embedder = None
+            if load_embedder is not None:
+                embedder = load_embedder(index.embedding_artifact)
+            recorded = index.embedding_model
+            if embedder and recorded and recorded != embedder.model_name:
+                raise ValueError(f"Cannot switch to {version}: was built with "
+                                 f"{recorded}, not {embedder.model_name}")
+            if not index.count():
+                raise ValueError(f"Cannot switch to {version}: index is empty")
+            index.warm_up()
+        except Exception:
+            # Keep serving the current version; do not retry this one.
+            self._rejected = version
+            raise
+        previous = self.version
+        self.index, self.version = index, version
+        INDEX_SWAPS.inc()
+        print(f"Vector index switched from {previous or self.path} to "
+              f"{version}")
+        return embedder
+
+    @property
+    def embedding_model(self) -> str:
+        return self.index.embedding_model
+
+    @property
+    def embedding_artifact(self) -> str:
+        return self.index.embedding_artifact
+
+    def count(self) -> int:
+        return self.index.count()
+
+    def warm_up(self):
+        self.index.warm_up()
+
+    def search(self, query_embedding: list, n_results: int = 5,
+               where: dict = None, include_embeddings: bool = False) -> dict:
+        return self.index.search(query_embedding, n_results, where,
+                                 include_embeddings)
+
+    def get_metadatas(self, where: dict, limit: int = 1) -> list:
+        return self.index.get_metadatas(where, limit)
+
+    def get_documents(self, where: dict, limit: int = 1) -> dict:
+        return self.index.get_documents(where, limit)
@@ -0,0 +1,257 @@
+import bisect
+import json
+import mmap
+import os
+import re
+import threading
+import numpy as np
+from config import settings
+from services.catalog import open_parts
+from services.packed import PackedStrings, staged_directory
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+FENCE_STRIDE = 64
+
+
+def normalize_model(value: str) -> str:
+    """Canonical form for matching: uppercase letters and digits only, so
+    'wdt780saem1', 'WDT-780SAEM1' and 'WDT780SAEM1' are the same model."""
+    return _NON_ALNUM.sub("", (value or "").upper())
+
+
+def write_model_index(path: str, parts: list) -> int:
+    """Write the model-number prefix index for every compatible_models value.
+
+    Models are stored sorted as one packed ASCII blob, with a parallel
+    bitmask of appliance types and a count of compatible parts."""
+    appliance_types = sorted({p.get("appliance_type") for p in parts
+                              if p.get("appliance_type")})
+    if len(appliance_types) > 8:
+        raise ValueError(f"Too many appliance types for the model index: "
+                         f"{appliance_types}")
+    type_bits = {name: 1 << i for i, name in enumerate(appliance_types)}
+
+    models = {}
+    for part in parts:
+        bit = type_bits.get(part.get("appliance_type"), 0)
+        for raw in part.get("compatible_models", []):
+            model = normalize_model(raw)
+            if model:
+                mask, count = models.get(model, (0, 0))
+                models[model] = (mask | bit, count + 1)
+    ordered = sorted(models)
+
+    with staged_directory(path) as staging:
+        PackedStrings.write(os.path.join(staging, "models"), ordered)
+        np.save(os.path.join(staging, "appliance_mask.npy"),
+                np.asarray([models[m][0] for m in ordered], dtype=np.uint8))
+        np.save(os.path.join(staging, "part_count.npy"),
+                np.asarray([models[m][1] for m in ordered], dtype=np.int32))
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump({"count": len(ordered),
+                       "appliance_types": appliance_types}, f)
+    return len(ordered)
+
+
+class ModelIndex:
+    """Memory-mapped sorted array of model numbers.
+
+    The sorted array doubles as an implicit trie: every prefix is a
+    contiguous row range found by binary search, so exact completion is two
+    bisections and fuzzy completion walks only the trie branches that stay
+    within the edit budget. Keys are compared as raw bytes straight from the
+    mapped blob, without decoding whole strings."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.MODEL_INDEX_PATH
+        with open(os.path.join(self.path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.models = PackedStrings.load(os.path.join(self.path, "models"))
+        self.appliance_mask = np.load(
+            os.path.join(self.path, "appliance_mask.npy"), mmap_mode="r")
+        self.part_count = np.load(
+            os.path.join(self.path, "part_count.npy"), mmap_mode="r")
+        self.appliance_types = self.manifest["appliance_types"]
+        # Raw views over the same mapped files: slicing the mmap yields
+        # bytes and indexing the memoryview yields ints, both far cheaper
+        # than going through numpy scalars in the search loops.
+        self._blob = b""
+        blob_path = os.path.join(self.path, "models.bin")
+        if os.path.getsize(blob_path):
+            with open(blob_path, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = memoryview(self.models.offsets).cast("B").cast("q")
+        self._children_cache = {}
+        # Every FENCE_STRIDE-th key, held in memory as a sparse top level.
+        self._fence = [self._key(row)
+                       for row in range(0, len(self), FENCE_STRIDE)]
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def _key(self, row: int) -> bytes:
+        return self._blob[self._offsets[row]:self._offsets[row + 1]]
+
+    def _lower_bound(self, target: bytes, lo: int, hi: int) -> int:
+        """First row in [lo, hi) whose key is >= target."""
+        if hi - lo > 2 * FENCE_STRIDE:
+            # Narrow to one block with a C-level bisect over the fence keys.
+            block = bisect.bisect_left(self._fence, target)
+            start = max(lo, (block - 1) * FENCE_STRIDE + 1) if block else lo
+            end = min(hi, block * FENCE_STRIDE)
+            if start > end:
+                return hi if start > hi else lo
+            lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _prefix_range(self, prefix: bytes, lo: int = 0, hi: int = None):
+        """Rows [start, end) whose key starts with prefix."""
+        hi = len(self) if hi is None else hi
+        start = self._lower_bound(prefix, lo, hi)
+        if start == hi or not self._key(start).startswith(prefix):
+            return start, start
+        # Keys are [0-9A-Z], so prefix + 0x7f sorts after all of them.
+        end = self._lower_bound(prefix + b"\x7f", start, hi)
+        return start, end
+
+    def _match(self, row: int, distance: int) -> dict:
+        mask = int(self.appliance_mask[row])
+        return {
+            "model": self._key(row).decode("ascii"),
+            "appliance_types": [name for i, name
+                                in enumerate(self.appliance_types)
+                                if mask & (1 << i)],
+            "part_count": int(self.part_count[row]),
+            "distance": distance,
+        }
+
+    def lookup(self, model: str) -> dict:
+        """The exact model, or None."""
+        key = normalize_model(model).encode("ascii")
+        row = self._lower_bound(key, 0, len(self))
+        if key and row < len(self) and self._key(row) == key:
+            return self._match(row, 0)
+        return None
+
+    def complete(self, prefix: str, limit: int = 10,
+                 max_edits: int = 0) -> list:
+        """Models starting with prefix, or within max_edits edits of a
+        string that does. Closer matches first, then alphabetical.
+
+        Each distance is searched only while the closer ones have found
+        fewer than limit models, and its walk stops as soon as limit is
+        reached, so the fuller the completions the cheaper the typo search.
+        Within the last distance searched the matches are the first limit
+        the walk reached, in alphabetical order."""
+        query = normalize_model(prefix).encode("ascii")
+        if not query or limit <= 0:
+            return []
+        start, end = self._prefix_range(query)
+        rows = range(start, min(end, start + limit))
+        matches = [self._match(row, 0) for row in rows]
+        seen = set(rows)
+        for edits in range(1, max_edits + 1):
+            if len(matches) >= limit:
+                break
+            found = []
+
+            def take(start: int, end: int) -> bool:
+                for row in range(start, end):
+                    if len(matches) + len(found) >= limit:
+                        return True
+                    if row not in seen:
+                        seen.add(row)
+                        found.append(row)
+                return len(matches) + len(found) >= limit
+
+            self._fuzzy_walk(query, edits, take)
+            matches.extend(self._match(row, edits) for row in sorted(found))
+        return matches
+
+    def _children(self, depth: int, lo: int, hi: int) -> tuple:
+        """(byte, start, end) for each child of the trie node whose rows
+        are [lo, hi) and whose keys share their first depth bytes. Shallow
+        nodes are revisited by almost every fuzzy query, so results are
+        cached."""
+        key = (depth, lo, hi)
+        children = self._children_cache.get(key)
+        if children is not None:
+            return children
+        children = []
+        size = hi - lo
+        # A key equal to the node's prefix sorts first and has no child.
+        if lo < hi and self._offsets[lo + 1] - self._offsets[lo] == depth:
+            lo += 1
+        while lo < hi:
+            char = self._blob[self._offsets[lo] + depth]
+            prefix = self._blob[self._offsets[lo]:self._offsets[lo] + depth]
+            end = self._lower_bound(prefix + bytes((char, 0x7f)), lo, hi)
+            children.append((char, lo, end))
+            lo = end
+        children = tuple(children)
+        if size > 64:
+            if len(self._children_cache) >= 4096:
+                self._children_cache.clear()
+            self._children_cache[key] = children
+        return children
+
+    def _fuzzy_walk(self, query: bytes, max_edits: int, take):
+        """Call take(start, end) for each row range whose keys start with a
+        string within max_edits edits of query, until take returns True.
+
+        Follows query through the implicit trie; at each node on the way it
+        spends an edit on a deletion, insertion or substitution and recurses
+        with the remaining budget. Once the budget is spent the rest of the
+        query must match exactly, which is one prefix lookup, so the walk
+        only branches over real children near the typo."""
+
+        def walk(i: int, prefix: bytes, lo: int, hi: int, edits: int) -> bool:
+            if edits == max_edits:
+                start, end = self._prefix_range(prefix + query[i:], lo, hi)
+                return start < end and take(start, end)
+            for j in range(i, len(query) + 1):
+                if j > i:
+                    lo, hi = self._prefix_range(prefix + query[i:j], lo, hi)
+                    if lo == hi:
+                        return False
+                node = prefix + query[i:j]
+                if j == len(query):
+                    return take(lo, hi)
+                if walk(j + 1, node, lo, hi, edits + 1):
+                    return True
+                for char, start, end in self._children(len(node), lo, hi):
+                    child = node + bytes((char,))
+                    if walk(j, child, start, end, edits + 1):
+                        return True
+                    if (char != query[j]
+                            and walk(j + 1, child, start, end, edits + 1)):
+                        return True
+            return False
+
+        walk(0, b"", 0, len(self), 0)
+
+
+_model_index = None
+_model_index_lock = threading.Lock()
+
+
+def get_model_index() -> ModelIndex:
+    """Open the shared model index, building it from PARTS_PATH on first
+    use if it has not been built yet. Returns None if neither exists."""
+    global _model_index
+    if _model_index is None:
+        with _model_index_lock:
+            if _model_index is None:
+                path = settings.MODEL_INDEX_PATH
+                if not os.path.exists(os.path.join(path, "manifest.json")):
+                    if not os.path.exists(settings.PARTS_PATH):
+                        return None
+                    write_model_index(path, open_parts(settings.PARTS_PATH))
+                _model_index = ModelIndex(path)
+    return _model_index
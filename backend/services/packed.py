@@ -0,0 +1,97 @@
+import bisect
+import os
+import shutil
+from contextlib import contextmanager
+import numpy as np
+
+
+class PackedStrings:
+    """Read-only sequence of strings stored as one UTF-8 blob plus an offsets
+    array. Both files are memory-mapped, so every process that opens them
+    shares the same page-cache copy instead of holding its own Python strs."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        # Plain memoryviews over the same buffers: indexing them returns
+        # Python ints and bytes slices without numpy scalar overhead.
+        self._blob = memoryview(blob)
+        self._offsets = memoryview(offsets).cast("B").cast("q")
+        self._count = len(offsets) - 1
+
+    @staticmethod
+    def write(path_prefix: str, strings) -> int:
+        offsets = [0]
+        with open(f"{path_prefix}.bin", "wb") as f:
+            for value in strings:
+                data = value.encode("utf-8")
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        np.save(f"{path_prefix}.offsets.npy",
+                np.asarray(offsets, dtype=np.int64))
+        return len(offsets) - 1
+
+    @classmethod
+    def load(cls, path_prefix: str) -> "PackedStrings":
+        offsets = np.load(f"{path_prefix}.offsets.npy", mmap_mode="r")
+        if os.path.getsize(f"{path_prefix}.bin") == 0:
+            blob = np.zeros(0, dtype=np.uint8)
+        else:
+            blob = np.memmap(f"{path_prefix}.bin", dtype=np.uint8, mode="r")
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return str(self._blob[start:end], "utf-8")
+
+    def find(self, value: str) -> int:
+        """Position of value in a sorted PackedStrings, or -1."""
+        i = bisect.bisect_left(self, value)
+        if i < len(self) and self[i] == value:
+            return i
+        return -1
+
+
+def dictionary_encode(values: list) -> tuple:
+    """Encode values as int32 codes into a sorted vocabulary."""
+    vocabulary = sorted(set(values))
+    lookup = {value: code for code, value in enumerate(vocabulary)}
+    codes = np.fromiter((lookup[v] for v in values), dtype=np.int32,
+                        count=len(values))
+    return codes, vocabulary
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row (or a single vector) to unit length, leaving zero
+    vectors as they are, so dot products are cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+@contextmanager
+def staged_directory(path: str):
+    """Yield an empty staging directory to write a read-only index into,
+    then swap it in for path, replacing any previous index there.
+
+    Readers never open a partially written index; path is missing only
+    between two renames. If the block raises, path is left untouched."""
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        yield staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    previous = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
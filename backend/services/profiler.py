@@ -0,0 +1,128 @@
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from config import settings
+from services.metrics import current_timings, set_attribute, PROFILES_CAPTURED
+
+_active = 0
+_active_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread.
+
+    The target runs unmodified, with no trace or profile hooks installed;
+    the sampler reads its current frame through sys._current_frames every
+    interval seconds and counts each distinct stack. Frames above root
+    (the caller that started profiling) are left out."""
+
+    def __init__(self, thread_id: int, interval: float, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler",
+                                        daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root:
+                code = frame.f_code
+                module = frame.f_globals.get("__name__", "?")
+                # co_qualname (Class.method) is new in Python 3.11.
+                name = getattr(code, "co_qualname", code.co_name)
+                stack.append(f"{module}:{name}")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        """Stacks in the folded format read by flamegraph.pl, speedscope
+        and inferno: one "root;...;leaf count" line per stack."""
+        return "".join(f"{stack} {count}\n"
+                       for stack, count in sorted(self.stacks.items()))
+
+
+def profile_trigger(token: str = None) -> str:
+    """Why this request should be profiled: "header" for a request carrying
+    PROFILE_TOKEN, "sampled" for the PROFILE_SAMPLE_RATE fraction of
+    traffic, or None. Sampled profiles are skipped while another profile is
+    running so sampling cannot pile up under load."""
+    if (settings.PROFILE_TOKEN and token
+            and hmac.compare_digest(token, settings.PROFILE_TOKEN)):
+        return "header"
+    if (settings.PROFILE_SAMPLE_RATE > 0 and not _active
+            and random.random() < settings.PROFILE_SAMPLE_RATE):
+        return "sampled"
+    return None
+
+
+def profile_call(trigger: str, fn, *args, **kwargs):
+    """Run fn on this thread under the sampling profiler, then write the
+    profile to PROFILE_DIR tagged with the active request's timings."""
+    global _active
+    with _active_lock:
+        _active += 1
+    profiler = SamplingProfiler(threading.get_ident(),
+                                settings.PROFILE_INTERVAL_MS / 1000,
+                                root=sys._getframe()).start()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.stop()
+        with _active_lock:
+            _active -= 1
+        try:
+            name = save_profile(profiler, trigger)
+            PROFILES_CAPTURED.labels(trigger).inc()
+            set_attribute("profile", name)
+        except OSError as e:
+            print(f"Could not write profile: {e}")
+
+
+def save_profile(profiler: SamplingProfiler, trigger: str) -> str:
+    """Write <name>.folded and a <name>.json sidecar with the trigger and
+    the request's stage timings, keeping the newest PROFILE_MAX_FILES
+    profiles. Returns the name."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    base = os.path.join(settings.PROFILE_DIR, name)
+    with open(f"{base}.folded", "w") as f:
+        f.write(profiler.folded())
+    timings = current_timings()
+    with open(f"{base}.json", "w") as f:
+        json.dump({
+            "trigger": trigger,
+            "samples": profiler.samples,
+            "interval_ms": settings.PROFILE_INTERVAL_MS,
+            "timings": timings.as_dict() if timings is not None else None,
+        }, f, indent=2)
+
+    names = sorted(f[:-len(".folded")] for f in os.listdir(settings.PROFILE_DIR)
+                   if f.endswith(".folded"))
+    for old in names[:max(0, len(names) - settings.PROFILE_MAX_FILES)]:
+        for suffix in (".folded", ".json"):
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, old + suffix))
+            except FileNotFoundError:
+                pass
+    return name
@@ -0,0 +1,13 @@
+from config import settings
+
+
+def create_openai_client():
+    """Shared OpenAI client construction for the chat and embedding
+    providers, so base URL and credentials are configured in one place."""
+    # Imported here so the server can bind before the SDK is loaded.
+    from openai import OpenAI
+
+    # Retries and timeouts are handled by services.resilience.
+    return OpenAI(api_key=settings.OPENAI_API_KEY,
+                  base_url=settings.OPENAI_BASE_URL or None,
+                  max_retries=0)
@@ -1,47 +1,178 @@
 import re
-from services.embedding_service import EmbeddingService
+from config import settings
+from services.embedding_service import embedding_service_for
+from services.diversify import diversify
+from services.model_index import get_model_index
 from services.llm_service import LLMService
-from services.vector_store import VectorStore
-from services.guardrails import quick_topic_check, build_off_topic_response
+from services.vector_store import create_vector_store
+from services.guardrails import (
+    quick_topic_check, build_off_topic_response, is_follow_up
+)
+from services.metrics import (
+    span, record_guardrail, record_retrieval_tier, set_attribute,
+    current_timings, DEGRADED_RESPONSES, FAST_PATH_HITS, SEARCHES_PER_REQUEST,
+    STATE_CARRIED
+)
+from services.resilience import UpstreamUnavailable
 from prompts.system_prompt import SYSTEM_PROMPT, TOPIC_CHECK_PROMPT
 
+# Structured questions the fast path answers from chunk metadata alone.
+FAST_PATH_QUESTIONS = [
+    ("price", re.compile(r"\b(how much|price|cost)\b", re.IGNORECASE)),
+    ("stock", re.compile(r"\b(in stock|available|availability)\b",
+                         re.IGNORECASE)),
+    # Only "what is PS…" (or "what is it" about a carried part), so
+    # questions that merely start with "what is" go to the LLM.
+    ("identity", re.compile(r"\b(what is|what's|what part is)\s+"
+                            r"(part\s+)?(PS\d{6,}|it|this|that)\b",
+                            re.IGNORECASE)),
+]
+# Questions about the conversation's part that name no topic keyword
+# ("how much is it?", "does that one fit?"): the fast-path questions and
+# fit checks.
+PART_FOLLOW_UPS = [pattern for _, pattern in FAST_PATH_QUESTIONS] + [
+    re.compile(r"\b(fit|fits|compatible|work with)\b", re.IGNORECASE),
+]
+
+
+def next_state(state: dict, turn: dict) -> dict:
+    """Conversation state after a turn: whatever the turn resolved, and
+    whatever earlier turns resolved for the rest."""
+    state = dict(state or {})
+    entities = turn.get("entities") or {}
+    ps_numbers = entities.get("ps_numbers") or []
+    models = [m for m in entities.get("model_numbers") or []
+              if m.upper() not in ps_numbers]
+    if ps_numbers:
+        state["ps_number"] = ps_numbers[0]
+    if models:
+        state["model_number"] = models[0]
+    if turn.get("appliance_type"):
+        state["appliance_type"] = turn["appliance_type"]
+    if turn.get("intent"):
+        state["intent"] = turn["intent"]
+    return state
+
 
 class RAGService:
     def __init__(self):
-        self.embedding_service = EmbeddingService()
         self.llm_service = LLMService()
-        self.vector_store = VectorStore()
+        self.vector_store = create_vector_store()
+        self.embedding_service = embedding_service_for(
+            self.vector_store.embedding_artifact
+        )
+        self.model_index = get_model_index()
+
+        indexed_with = self.vector_store.embedding_model
+        if indexed_with and indexed_with != self.embedding_service.model_name:
+            raise RuntimeError(
+                f"Index was built with embedding model '{indexed_with}' but "
+                f"queries would use '{self.embedding_service.model_name}'. "
+                f"Rebuild the index or change EMBEDDING_PROVIDER."
+            )
+
+    def _embedder_for(self, artifact: str):
+        return embedding_service_for(artifact, self.embedding_service)
+
+    def refresh_index(self):
+        """Follow the active-index pointer, switching the embedding service
+        along with the index when it was built with another local
+        embedder."""
+        if not hasattr(self.vector_store, "refresh"):
+            return
+        embedder = self.vector_store.refresh(self._embedder_for)
+        if embedder is not None:
+            self.embedding_service = embedder
+
+    def activate_index(self, name: str):
+        """Serve index version name and publish it to the other workers."""
+        embedder = self.vector_store.activate(name, self._embedder_for, True)
+        if embedder is not None:
+            self.embedding_service = embedder
+
+    def process_query(self, message: str, conversation_history: list,
+                      page_url: str = None, state: dict = None,
+                      trusted_state: bool = False) -> dict:
+        """Run the RAG pipeline for one message.
+
+        state is what earlier turns resolved (see next_state). A follow-up
+        such as "how do I install it?" reuses its part, model and appliance
+        type instead of re-deriving them from the message alone.
+        trusted_state means state was loaded from the server's session
+        store rather than sent by the client.
+
+        Blocking: upstream calls are synchronous, so callers on the event
+        loop should run this in a worker thread."""
+        state = state or {}
+        follow_up = is_follow_up(message)
 
-    async def process_query(self, message: str,
-                            conversation_history: list,
-                            page_url: str = None) -> dict:
         # Step 1: Guardrails - topic check
-        topic = quick_topic_check(message)
-        if topic == "LIKELY_OFF_TOPIC":
+        with span("guardrail"):
+            topic = quick_topic_check(message)
+        if (topic == "LIKELY_OFF_TOPIC" and follow_up and trusted_state
+                and state.get("ps_number")
+                and any(p.search(message) for p in PART_FOLLOW_UPS)):
+            # "how much is it?" has no topic keywords, but in a session
+            # already about a part it can only mean that part. State the
+            # client sent is not trusted to overrule the keyword check.
+            record_guardrail("session_follow_up")
+        elif (topic == "UNCERTAIN" and follow_up
+                and (state.get("ps_number") or state.get("appliance_type"))):
+            # A follow-up about a part already being discussed needs no LLM
+            # topic check. State may come from the client, so it only
+            # settles borderline messages; keyword off-topic still wins.
+            record_guardrail("state_follow_up")
+        elif topic == "LIKELY_OFF_TOPIC":
+            record_guardrail("keyword_off_topic")
             return build_off_topic_response()
-        if topic == "UNCERTAIN":
-            classification = self.llm_service.classify(
-                TOPIC_CHECK_PROMPT.format(message=message)
-            )
-            if "OFF_TOPIC" in classification.upper():
+        elif topic == "UNCERTAIN":
+            classification = self._classify(message)
+            if classification is None:
+                # Fail open: an on-topic user should not be turned away
+                # because the classifier is down.
+                record_guardrail("classify_unavailable")
+            elif "OFF_TOPIC" in classification.upper():
+                record_guardrail("llm_off_topic")
                 return build_off_topic_response()
+            else:
+                record_guardrail("llm_on_topic")
+        else:
+            record_guardrail("keyword_on_topic")
 
         # Step 2: Detect intent and extract entities
-        intent = self._detect_intent(message)
-        entities = self._extract_entities(message)
+        with span("entities"):
+            intent = self._detect_intent(message)
+            entities = self._extract_entities(message)
+        set_attribute("intent", intent)
 
         # Extract PS number from the currently viewed page URL
         if page_url:
             page_ps = re.search(r'PS(\d{5,})', page_url)
             if page_ps:
-                page_ps_number = f"PS{page_ps.group(1)}"
-                if page_ps_number not in entities.get("ps_numbers", []):
-                    entities.setdefault("ps_numbers", []).insert(
-                        0, page_ps_number
-                    )
+                entities["page_ps_number"] = f"PS{page_ps.group(1)}"
+
+        carried = (self._carry_state(intent, entities, state, follow_up)
+                   if state else [])
+        # The page's part only stands in when neither the message nor the
+        # conversation names one, so it never displaces the part asked about.
+        if not entities.get("ps_numbers") and entities.get("page_ps_number"):
+            entities["ps_numbers"] = [entities["page_ps_number"]]
+
+        # Step 2a: Answer simple price/stock/identity lookups for a single
+        # known part straight from the index, without the LLM
+        if settings.FAST_PATH_ENABLED:
+            with span("fast_path"):
+                fast = self._try_fast_path(
+                    message, intent, entities, carried
+                )
+            if fast:
+                return fast
 
         # Step 2b: Detect appliance type and check for mismatches
-        appliance_type = self._detect_appliance_type(message, entities)
+        with span("appliance_type"):
+            appliance_type = self._detect_appliance_type(
+                message, entities, state.get("appliance_type")
+            )
 
         mismatch = self._check_compatibility_mismatch(
             intent, entities, appliance_type
@@ -50,97 +181,255 @@ class RAGService:
             return mismatch
 
         # Step 3: Embed query and search vector store
-        query_embedding = self.embedding_service.embed(message)
+        with span("embed"):
+            query_embedding = self.embedding_service.embed(message)
 
-        # If a specific PS number is mentioned (or detected from page),
-        # get ALL chunks for that part first
-        results = None
-        if entities.get("ps_numbers"):
-            ps_num = entities["ps_numbers"][0]
-            results = self.vector_store.search(
-                query_embedding, n_results=5,
-                where={"ps_number": ps_num}
+        with span("retrieval"):
+            results = self._retrieve(
+                query_embedding, intent, entities, appliance_type
             )
-
-        # Try OEM part number lookup if no PS number matched
-        if (not results or not results.get("documents")
-                or not results["documents"][0]):
-            for oem in entities.get("oem_candidates", []):
-                try:
-                    oem_results = self.vector_store.search(
-                        query_embedding, n_results=5,
-                        where={"oem_part_number": oem}
-                    )
-                    if (oem_results and oem_results.get("documents")
-                            and oem_results["documents"][0]):
-                        results = oem_results
-                        break
-                except Exception:
-                    continue
-
-        # If no PS number or no results, use intent + appliance type filtering
-        if (not results or not results.get("documents")
-                or not results["documents"][0]):
-            where_filter = None
-            chunk_filter = None
-            if intent == "COMPATIBILITY_CHECK":
-                chunk_filter = {"chunk_type": "compatibility"}
-            elif intent == "TROUBLESHOOT":
-                chunk_filter = {"chunk_type": "overview"}
-
-            appliance_filter = ({"appliance_type": appliance_type}
-                                if appliance_type else None)
-
-            if chunk_filter and appliance_filter:
-                where_filter = {"$and": [chunk_filter, appliance_filter]}
-            elif chunk_filter:
-                where_filter = chunk_filter
-            elif appliance_filter:
-                where_filter = appliance_filter
-
-            results = self.vector_store.search(
-                query_embedding, n_results=5, where=where_filter
-            )
-
-        # Fallback: appliance-type only
-        if (not results or not results.get("documents")
-                or not results["documents"][0]):
-            if appliance_type:
-                results = self.vector_store.search(
-                    query_embedding, n_results=5,
-                    where={"appliance_type": appliance_type}
-                )
-
-        # Final fallback: unfiltered semantic search
-        if (not results or not results.get("documents")
-                or not results["documents"][0]):
-            results = self.vector_store.search(query_embedding, n_results=5)
+        if settings.DIVERSIFY_ENABLED:
+            with span("diversify"):
+                results = diversify(results, query_embedding, intent)
 
         # Step 4: Build context from retrieved documents
-        context = self._build_context(results)
+        with span("context"):
+            context = self._build_context(results)
 
         # Step 5: Generate response with GPT-4
         system_prompt = SYSTEM_PROMPT.format(context=context)
         messages = conversation_history[-10:] + [
             {"role": "user", "content": message}
         ]
-        response_text = self.llm_service.chat(system_prompt, messages)
+        try:
+            with span("llm"):
+                response_text = self.llm_service.chat(system_prompt, messages)
+        except UpstreamUnavailable:
+            DEGRADED_RESPONSES.labels("chat").inc()
+            set_attribute("degraded", "chat")
+            return self._build_retrieval_only_response(
+                results, intent, entities, appliance_type
+            )
 
         # Step 6: Extract part cards filtered by relevance
-        part_cards = self._extract_part_cards(
-            results, response_text, appliance_type
-        )
+        with span("postprocess"):
+            part_cards = self._extract_part_cards(
+                results, response_text, appliance_type
+            )
+
+            # Step 7: Generate suggested follow-up queries
+            suggested = self._generate_suggestions(intent, entities)
 
-        # Step 7: Generate suggested follow-up queries
-        suggested = self._generate_suggestions(intent, entities)
+        timings = current_timings()
+        if timings is not None:
+            SEARCHES_PER_REQUEST.observe(len(timings.searches))
 
         return {
             "role": "assistant",
             "content": response_text,
             "parts": part_cards,
-            "suggested_queries": suggested
+            "suggested_queries": suggested,
+            "turn": {
+                "intent": intent,
+                "entities": entities,
+                "appliance_type": appliance_type
+            }
         }
 
+    def _carry_state(self, intent: str, entities: dict, state: dict,
+                     follow_up: bool):
+        """Fill entities the message leaves out from the conversation state,
+        so follow-ups get the PS-number and model filters and the fast path
+        rather than an unfiltered search."""
+        carried = []
+        if (not entities.get("ps_numbers") and state.get("ps_number")
+                and follow_up):
+            entities["ps_numbers"] = [state["ps_number"]]
+            carried.append("ps_number")
+        models = [m for m in entities.get("model_numbers", [])
+                  if m.upper() not in entities.get("ps_numbers", [])]
+        if (not models and state.get("model_number")
+                and (follow_up or intent == "COMPATIBILITY_CHECK")):
+            entities.setdefault("model_numbers", []).append(
+                state["model_number"]
+            )
+            carried.append("model_number")
+        for field in carried:
+            STATE_CARRIED.labels(field).inc()
+        if carried:
+            set_attribute("state_carried", carried)
+        return carried
+
+    def _try_fast_path(self, message: str, intent: str, entities: dict,
+                       carried: list = ()) -> dict:
+        """Template answer for a structured question about exactly one part,
+        named in the message or carried over by a follow-up (a part only
+        known from the page URL is not enough). Returns None whenever the
+        LLM path should handle the query."""
+        if intent not in ("PART_LOOKUP", "GENERAL"):
+            return None
+        named = list(dict.fromkeys(
+            p.upper() for p in re.findall(r'PS\d{6,}', message, re.IGNORECASE)
+        ))
+        ps_numbers = named or (entities.get("ps_numbers", [])[:1]
+                               if "ps_number" in carried else [])
+        if len(ps_numbers) != 1:
+            return None
+        # A question naming a model is about that model, not the part.
+        if "model_number" not in carried and any(
+                m.upper() not in named
+                for m in entities.get("model_numbers", [])):
+            return None
+        question = next((name for name, pattern in FAST_PATH_QUESTIONS
+                         if pattern.search(message)), None)
+        if question is None:
+            return None
+
+        ps = ps_numbers[0]
+        found = self.vector_store.get_documents(
+            where={"$and": [{"ps_number": ps}, {"chunk_type": "overview"}]}
+        )
+        if not found["metadatas"]:
+            return None
+        meta = found["metadatas"][0]
+        overview = found["documents"][0] if found["documents"] else ""
+        name = meta.get("name") or ps
+        price = meta.get("price")
+        in_stock = None
+        if "Availability: In Stock" in overview:
+            in_stock = True
+        elif "Availability: Out of Stock" in overview:
+            in_stock = False
+
+        availability = ""
+        if in_stock is not None:
+            availability = (" It is currently **in stock**." if in_stock
+                            else " It is currently **out of stock**.")
+        if question == "price":
+            if not price:
+                return None
+            content = f"**{name}** ({ps}) is **{price}**.{availability}"
+        elif question == "stock":
+            if in_stock is None:
+                return None
+            content = (f"**{name}** ({ps}) is currently "
+                       f"**{'in stock' if in_stock else 'out of stock'}**.")
+            if price:
+                content += f" The price is **{price}**."
+        else:
+            content = f"**{ps}** is the **{name}**."
+            if meta.get("oem_part_number"):
+                content += (f" Its manufacturer part number is "
+                            f"**{meta['oem_part_number']}**.")
+            if price:
+                content += f" The price is **{price}**."
+            content += availability
+
+        FAST_PATH_HITS.labels(question).inc()
+        set_attribute("fast_path", question)
+        return {
+            "role": "assistant",
+            "content": content,
+            "parts": [{
+                "ps_number": ps,
+                "name": name,
+                "price": price,
+                "image_url": meta.get("image_url"),
+                "part_url": meta.get("source_url"),
+                "in_stock": in_stock,
+                "oem_part_number": meta.get("oem_part_number")
+            }],
+            "suggested_queries": self._generate_suggestions(
+                "PART_LOOKUP", entities
+            ),
+            "turn": {
+                "intent": intent,
+                "entities": entities,
+                "appliance_type": meta.get("appliance_type")
+            }
+        }
+
+    def _retrieve(self, query_embedding: list, intent: str,
+                  entities: dict, appliance_type: str) -> dict:
+        """Run the tiered filtered searches, most specific first.
+
+        With diversification on, each tier over-fetches candidates with
+        their embeddings so the diversify stage has something to pick from."""
+        if settings.DIVERSIFY_ENABLED:
+            fetch = {"n_results": settings.RETRIEVAL_FETCH_K,
+                     "include_embeddings": True}
+        else:
+            fetch = {"n_results": settings.MAX_CONTEXT_CHUNKS}
+        # If a specific PS number is mentioned (or detected from page),
+        # get ALL chunks for that part first
+        if entities.get("ps_numbers"):
+            ps_num = entities["ps_numbers"][0]
+            results = self.vector_store.search(
+                query_embedding, where={"ps_number": ps_num},
+                **fetch
+            )
+            if self._has_documents(results):
+                record_retrieval_tier("ps_number")
+                return results
+
+        # Try OEM part number lookup if no PS number matched
+        for oem in entities.get("oem_candidates", []):
+            try:
+                results = self.vector_store.search(
+                    query_embedding, where={"oem_part_number": oem},
+                    **fetch
+                )
+                if self._has_documents(results):
+                    record_retrieval_tier("oem_part_number")
+                    return results
+            except Exception:
+                continue
+
+        # If no PS number or no results, use intent + appliance type filtering
+        where_filter = None
+        chunk_filter = None
+        if intent == "COMPATIBILITY_CHECK":
+            chunk_filter = {"chunk_type": "compatibility"}
+        elif intent == "TROUBLESHOOT":
+            chunk_filter = {"chunk_type": "overview"}
+
+        appliance_filter = ({"appliance_type": appliance_type}
+                            if appliance_type else None)
+
+        if chunk_filter and appliance_filter:
+            where_filter = {"$and": [chunk_filter, appliance_filter]}
+        elif chunk_filter:
+            where_filter = chunk_filter
+        elif appliance_filter:
+            where_filter = appliance_filter
+
+        results = self.vector_store.search(
+            query_embedding, where=where_filter, **fetch
+        )
+        if self._has_documents(results):
+            record_retrieval_tier("intent_filter" if where_filter
+                                  else "unfiltered")
+            return results
+
+        # Fallback: appliance-type only
+        if appliance_type:
+            results = self.vector_store.search(
+                query_embedding, where={"appliance_type": appliance_type},
+                **fetch
+            )
+            if self._has_documents(results):
+                record_retrieval_tier("appliance_type")
+                return results
+
+        # Final fallback: unfiltered semantic search
+        record_retrieval_tier("unfiltered")
+        return self.vector_store.search(query_embedding, **fetch)
+
+    @staticmethod
+    def _has_documents(results: dict) -> bool:
+        return bool(results and results.get("documents")
+                    and results["documents"][0])
+
     def _detect_intent(self, message: str) -> str:
         lower = message.lower()
         if any(w in lower for w in [
@@ -167,6 +456,16 @@ class RAGService:
         model_numbers = re.findall(
             r'\b[A-Z]{2,}\d{3,}[A-Z]*\d*[A-Z]*\b', message
         )
+        # Catch lowercase or hyphenated model numbers the pattern misses
+        # by checking candidate tokens against the known models.
+        if self.model_index is not None:
+            for token in re.findall(r'\b[A-Za-z0-9-]{5,}\b', message):
+                if not (re.search(r'[A-Za-z]', token)
+                        and re.search(r'\d', token)):
+                    continue
+                match = self.model_index.lookup(token)
+                if match and match["model"] not in model_numbers:
+                    model_numbers.append(match["model"])
         # Also capture standalone numeric part numbers (e.g., "242126602")
         oem_candidates = list(model_numbers) + re.findall(
             r'\b\d{6,}\b', message
@@ -177,9 +476,11 @@ class RAGService:
             "oem_candidates": oem_candidates
         }
 
-    def _detect_appliance_type(self, message: str, entities: dict) -> str:
+    def _detect_appliance_type(self, message: str, entities: dict,
+                               fallback: str = None) -> str:
         """Detect whether the query is about a refrigerator or dishwasher.
-        Returns 'Refrigerator', 'Dishwasher', or None."""
+        fallback is the appliance type from earlier turns, used before
+        asking the LLM. Returns 'Refrigerator', 'Dishwasher', or None."""
         lower = message.lower()
 
         fridge_keywords = ["refrigerator", "fridge", "freezer", "ice maker"]
@@ -199,28 +500,48 @@ class RAGService:
             if ps_type:
                 return ps_type
 
+        # A known model number pins the appliance type without the LLM
+        if self.model_index is not None:
+            for model in entities.get("model_numbers", []):
+                match = self.model_index.lookup(model)
+                if match and len(match["appliance_types"]) == 1:
+                    return match["appliance_types"][0]
+
+        # The conversation already settled the appliance type
+        if fallback:
+            STATE_CARRIED.labels("appliance_type").inc()
+            set_attribute("state_appliance_type", fallback)
+            return fallback
+
         # LLM fallback for ambiguous queries
         if fridge_score > 0 or dw_score > 0 or entities.get("model_numbers"):
-            classification = self.llm_service.classify(
-                TOPIC_CHECK_PROMPT.format(message=message)
-            )
-            if "REFRIGERATOR" in classification.upper():
+            classification = (self._classify(message) or "").upper()
+            if "REFRIGERATOR" in classification:
                 return "Refrigerator"
-            if "DISHWASHER" in classification.upper():
+            if "DISHWASHER" in classification:
                 return "Dishwasher"
 
         return None
 
+    def _classify(self, message: str) -> str:
+        """LLM topic/appliance classification, or None if it is down."""
+        try:
+            with span("classify"):
+                return self.llm_service.classify(
+                    TOPIC_CHECK_PROMPT.format(message=message)
+                )
+        except UpstreamUnavailable:
+            DEGRADED_RESPONSES.labels("classify").inc()
+            return None
+
     def _lookup_part_appliance_type(self, ps_number: str) -> str:
         """Look up a part's appliance type from ChromaDB metadata."""
         try:
-            results = self.vector_store.search(
-                [0.0] * 1536, n_results=1,
+            metadatas = self.vector_store.get_metadatas(
                 where={"ps_number": ps_number}
             )
-            if (results and results.get("metadatas")
-                    and results["metadatas"][0]):
-                return results["metadatas"][0][0].get("appliance_type")
+            if metadatas:
+                return metadatas[0].get("appliance_type")
         except Exception:
             pass
         return None
@@ -277,6 +598,35 @@ class RAGService:
             chunks.append(f"{header}\n{doc}")
         return "\n\n---\n\n".join(chunks)
 
+    def _build_retrieval_only_response(self, results: dict, intent: str,
+                                       entities: dict,
+                                       appliance_type: str) -> dict:
+        """Degraded answer when chat is unavailable: the retrieved parts
+        as cards, with no generated text."""
+        cards = self._extract_part_cards(results, "", appliance_type)
+        if cards:
+            content = (
+                "I'm having trouble generating a detailed answer right now, "
+                "but these parts best match your question. Open a part for "
+                "its full details, or ask me again in a moment."
+            )
+        else:
+            content = (
+                "I'm having trouble answering right now. Please try again in "
+                "a moment, or call PartSelect at 1-888-738-4871."
+            )
+        return {
+            "role": "assistant",
+            "content": content,
+            "parts": cards,
+            "suggested_queries": self._generate_suggestions(intent, entities),
+            "turn": {
+                "intent": intent,
+                "entities": entities,
+                "appliance_type": appliance_type
+            }
+        }
+
     def _extract_part_cards(self, results: dict,
                             response_text: str = "",
                             appliance_type: str = None) -> list:
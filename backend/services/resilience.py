@@ -0,0 +1,239 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import settings
+from services.metrics import (
+    CIRCUIT_STATE, UPSTREAM_CALLS, UPSTREAM_HEDGES, UPSTREAM_RETRIES
+)
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call failed after retries, or its circuit is open."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: int = None):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after or settings.OVERLOAD_RETRY_AFTER
+        super().__init__(f"{upstream} is unavailable ({reason})")
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 429s and 5xx are worth another try.
+    Other 4xx responses will fail the same way again, and an exception
+    that is not from the transport at all is a bug, not an outage."""
+    from openai import APIConnectionError
+
+    if isinstance(error, (TimeoutError, ConnectionError,
+                          APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures so a provider brownout fails fast;
+    lets a single probe through once the reset timeout has passed."""
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int,
+                 reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: int):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(state)
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self._set_state(self.HALF_OPEN)
+                return
+            raise UpstreamUnavailable(self.name, "circuit_open",
+                                      max(1, int(remaining + 0.999)))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_inconclusive(self):
+        """The call failed for a reason that says nothing about the
+        upstream. A half-open probe is given back, so the next call
+        probes again instead of the circuit staying half-open."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.opened_at = time.monotonic() - self.reset_timeout
+                self._set_state(self.OPEN)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN
+                    or self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent calls so retries cannot multiply
+    load on a provider that is already struggling."""
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResilientCaller:
+    """Per-call deadline, budgeted retries, hedging and circuit breaking
+    around one upstream.
+
+    fn is called as fn(timeout) and must honour the timeout it is given.
+    With hedging on, a duplicate request is sent once the first has run
+    longer than the recent latency percentile, and whichever answers first
+    wins."""
+
+    _executor = ThreadPoolExecutor(max_workers=64,
+                                   thread_name_prefix="upstream")
+
+    def __init__(self, name: str, deadline: float, max_retries: int,
+                 hedge: bool):
+        self.name = name
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge = hedge and settings.HEDGE_PERCENTILE > 0
+        self.breaker = CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD,
+                                      settings.BREAKER_RESET_SECONDS)
+        self.budget = RetryBudget(settings.RETRY_BUDGET_RATIO)
+        self.latency = LatencyTracker()
+
+    def call(self, fn):
+        self.breaker.allow()
+        self.budget.deposit()
+        expires = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError(f"{self.name} deadline exceeded")
+                result = self._attempt(fn, remaining)
+            except Exception as e:
+                if not is_retryable(e):
+                    UPSTREAM_CALLS.labels(self.name, "rejected").inc()
+                    # A 4xx is an answer, so the upstream is reachable.
+                    if getattr(e, "status_code", None) is not None:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_inconclusive()
+                    raise
+                outcome = ("timeout" if isinstance(e, TimeoutError)
+                           or "Timeout" in type(e).__name__ else "error")
+                UPSTREAM_CALLS.labels(self.name, outcome).inc()
+                backoff = min(0.05 * 2 ** attempt, 1.0) * random.uniform(0.5, 1)
+                if (attempt < self.max_retries
+                        and time.monotonic() + backoff < expires
+                        and self.budget.withdraw()):
+                    attempt += 1
+                    UPSTREAM_RETRIES.labels(self.name).inc()
+                    time.sleep(backoff)
+                    continue
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(self.name, outcome) from e
+            UPSTREAM_CALLS.labels(self.name, "success").inc()
+            self.breaker.record_success()
+            return result
+
+    def _attempt(self, fn, timeout: float):
+        start = time.monotonic()
+        deadline = start + timeout
+        hedge_delay = self._hedge_delay()
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+
+        pending = {self._executor.submit(fn, timeout)}
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=wake - now,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.latency.observe(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+            if (hedge_at is not None and pending
+                    and time.monotonic() >= hedge_at):
+                UPSTREAM_HEDGES.labels(self.name).inc()
+                pending.add(self._executor.submit(
+                    fn, deadline - time.monotonic()
+                ))
+                hedge_at = None
+        if error is not None:
+            raise error
+        raise TimeoutError(f"{self.name} timed out after {timeout:.1f}s")
+
+    def _hedge_delay(self) -> float:
+        if not self.hedge:
+            return None
+        threshold = self.latency.percentile(settings.HEDGE_PERCENTILE)
+        if threshold is None:
+            return None
+        return max(threshold, settings.HEDGE_MIN_DELAY)
+
+
+callers = {
+    "embedding": ResilientCaller(
+        "embedding", settings.EMBEDDING_TIMEOUT, settings.UPSTREAM_MAX_RETRIES,
+        hedge="embedding" in settings.HEDGE_UPSTREAMS
+    ),
+    "classify": ResilientCaller(
+        "classify", settings.CLASSIFY_TIMEOUT, settings.UPSTREAM_MAX_RETRIES,
+        hedge="classify" in settings.HEDGE_UPSTREAMS
+    ),
+    "chat": ResilientCaller(
+        "chat", settings.CHAT_TIMEOUT, settings.UPSTREAM_MAX_RETRIES,
+        hedge="chat" in settings.HEDGE_UPSTREAMS
+    ),
+}
@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from config import settings
+
+# How often create() deletes expired sessions from SQLite.
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class SessionStore:
+    """Server-side conversation turns, kept in a bounded in-memory LRU.
+
+    When SESSION_DB_PATH is set, SQLite is the source of truth: sessions
+    survive restarts and LRU evictions, and uvicorn workers sharing the
+    file see each other's turns. The in-memory copy is then only a cache,
+    reused while its updated_at still matches the database. Sessions not
+    updated for SESSION_TTL_SECONDS are deleted from the database."""
+
+    def __init__(self, max_sessions: int = None, max_turns: int = None,
+                 db_path: str = None):
+        self.max_sessions = max_sessions or settings.SESSION_MAX_ENTRIES
+        self.max_turns = max_turns or settings.SESSION_MAX_TURNS
+        self.db_path = db_path if db_path is not None else settings.SESSION_DB_PATH
+        # session_id -> (turns, updated_at)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pruned_at = 0.0
+        if self.db_path:
+            # Autocommit mode, so append can take the write lock itself.
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False,
+                                       isolation_level=None, timeout=10)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, turns TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_updated_at "
+                "ON sessions (updated_at)"
+            )
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            updated_at = time.time()
+            if self._db is not None:
+                self._prune(updated_at)
+                self._write(session_id, [], updated_at)
+            self._cache(session_id, [], updated_at)
+        return session_id
+
+    def get(self, session_id: str) -> list:
+        """Return the stored turns for a session, or None if it is unknown."""
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if self._db is None:
+                if cached is None:
+                    return None
+                self._sessions.move_to_end(session_id)
+                return list(cached[0])
+            row = self._db.execute(
+                "SELECT updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                self._sessions.pop(session_id, None)
+                return None
+            if cached is not None and cached[1] == row[0]:
+                self._sessions.move_to_end(session_id)
+                return list(cached[0])
+            # Changed by another worker since it was cached.
+            row = self._db.execute(
+                "SELECT turns, updated_at FROM sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            turns = json.loads(row[0])
+            self._cache(session_id, turns, row[1])
+            return list(turns)
+
+    def append(self, session_id: str, *turns: dict):
+        with self._lock:
+            updated_at = time.time()
+            if self._db is None:
+                cached = self._sessions.get(session_id)
+                stored = cached[0] if cached is not None else []
+                stored = (stored + list(turns))[-self.max_turns:]
+                self._cache(session_id, stored, updated_at)
+                return
+            # Read-modify-write under SQLite's write lock, so concurrent
+            # appends from other workers are not lost.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT turns FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                stored = json.loads(row[0]) if row is not None else []
+                stored = (stored + list(turns))[-self.max_turns:]
+                self._write(session_id, stored, updated_at)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._cache(session_id, stored, updated_at)
+
+    def history(self, session_id: str) -> list:
+        """Stored turns reduced to the role/content pairs sent to the LLM."""
+        turns = self.get(session_id) or []
+        return [{"role": t["role"], "content": t["content"]} for t in turns]
+
+    def state(self, session_id: str) -> dict:
+        """The conversation state saved with the latest turn, if any."""
+        for turn in reversed(self.get(session_id) or []):
+            if turn.get("state"):
+                return turn["state"]
+        return None
+
+    def _cache(self, session_id: str, turns: list, updated_at: float):
+        self._sessions[session_id] = (turns, updated_at)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _prune(self, now: float):
+        if now - self._pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        self._db.execute("DELETE FROM sessions WHERE updated_at < ?",
+                         (now - settings.SESSION_TTL_SECONDS,))
+
+    def _write(self, session_id: str, turns: list, updated_at: float):
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (id, turns, updated_at) "
+            "VALUES (?, ?, ?)",
+            (session_id, json.dumps(turns), updated_at)
+        )
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from services.metrics import (
+    set_attribute, SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_IN_FLIGHT
+)
+
+
+def flight_key(*parts) -> str:
+    """Stable hash of the JSON-serialisable values that determine a result."""
+    encoded = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one computation.
+
+    The first caller for a key (the leader) starts the work as a task;
+    callers that arrive while it is running (followers) await the same task
+    instead of repeating it. A result or exception reaches every waiter.
+    Waiters are shielded from each other: a client disconnecting cancels
+    only its own wait, never the shared work. Per-key counts are kept for
+    the most recent max_keys keys."""
+
+    def __init__(self, name: str, max_keys: int = 100):
+        self.name = name
+        self.max_keys = max_keys
+        self._tasks = {}
+        self._stats = OrderedDict()
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def do(self, key: str, fn, label: str = None):
+        """Await fn() (a coroutine function), or the identical call already
+        running under key."""
+        task = self._tasks.get(key)
+        role = "follower" if task is not None else "leader"
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            SINGLE_FLIGHT_IN_FLIGHT.labels(self.name).inc()
+            task.add_done_callback(lambda t: self._done(key, t))
+        SINGLE_FLIGHT_CALLS.labels(self.name, role).inc()
+        set_attribute("single_flight", role)
+        self._count(key, role, label)
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._tasks.pop(key, None)
+        SINGLE_FLIGHT_IN_FLIGHT.labels(self.name).dec()
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieving the exception here also keeps asyncio from warning
+            # when every waiter has gone away.
+            SINGLE_FLIGHT_CALLS.labels(self.name, "error").inc()
+            self._count(key, "error")
+
+    def _count(self, key: str, role: str, label: str = None):
+        stats = self._stats.pop(key, None)
+        if stats is None:
+            stats = {"key": key, "label": label, "leader": 0, "follower": 0,
+                     "error": 0}
+        stats[role] += 1
+        self._stats[key] = stats
+        while len(self._stats) > self.max_keys:
+            self._stats.popitem(last=False)
+
+    def stats(self) -> dict:
+        """In-flight count and the recent keys, most coalesced first."""
+        keys = sorted(self._stats.values(),
+                      key=lambda s: (s["follower"], s["leader"]),
+                      reverse=True)
+        return {"in_flight": self.in_flight(),
+                "keys": [dict(s, in_flight=s["key"] in self._tasks)
+                         for s in keys]}
@@ -1,35 +1,338 @@
-import chromadb
+import os
+import socket
+import threading
+import time
 from config import settings
+from services.metrics import INDEX_SWAPS, span, record_search
+
+# File in CHROMA_DB_PATH naming the collection servers should query.
+ACTIVE_POINTER = "ACTIVE_COLLECTION"
+# Directory in CHROMA_DB_PATH where each server notes what it queries.
+SERVING_DIR = "serving"
+
+
+def _pointer_path() -> str:
+    return os.path.join(settings.CHROMA_DB_PATH, ACTIVE_POINTER)
+
+
+def read_active_collection() -> str:
+    """The collection the pointer file names; the configured base
+    collection for databases built before versioned collections."""
+    try:
+        with open(_pointer_path()) as f:
+            name = f.read().strip()
+        if name:
+            return name
+    except FileNotFoundError:
+        pass
+    return settings.CHROMA_COLLECTION_NAME
+
+
+def write_pointer(path: str, value: str):
+    """Write value to path through a temp file renamed over it, so readers
+    see the old value or the new one, never a mix."""
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, "w") as f:
+        f.write(value + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging, path)
+
+
+def write_active_collection(name: str):
+    """Point servers at name."""
+    os.makedirs(settings.CHROMA_DB_PATH, exist_ok=True)
+    write_pointer(_pointer_path(), name)
+
+
+def record_serving(name: str):
+    """Note that this process queries collection name. Refreshed on every
+    pointer poll; workers retiring an old version skip it while any note
+    newer than three poll intervals names it."""
+    directory = os.path.join(settings.CHROMA_DB_PATH, SERVING_DIR)
+    os.makedirs(directory, exist_ok=True)
+    write_pointer(
+        os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}"),
+        name
+    )
+
+
+def collections_in_use() -> set:
+    """Collections named by live serving notes. Notes left by stopped
+    workers go stale and are removed."""
+    directory = os.path.join(settings.CHROMA_DB_PATH, SERVING_DIR)
+    stale = time.time() - max(3 * settings.INDEX_POINTER_POLL_SECONDS, 60)
+    names = set()
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return names
+    for entry in entries:
+        if ".tmp-" in entry.name:
+            continue
+        try:
+            if entry.stat().st_mtime < stale:
+                os.remove(entry.path)
+                continue
+            with open(entry.path) as f:
+                names.add(f.read().strip())
+        except FileNotFoundError:
+            pass
+    return names
+
+
+def new_collection_version() -> str:
+    return (f"{settings.CHROMA_COLLECTION_NAME}__v"
+            f"{time.strftime('%Y%m%d%H%M%S')}")
+
+
+def hnsw_metadata(m: int = None, ef_construction: int = None,
+                  ef_search: int = None) -> dict:
+    """Collection metadata selecting cosine distance and the HNSW graph
+    parameters, defaulting to the HNSW_* settings. Chroma reads them only
+    when a collection is created, so new settings apply from the next
+    build_index."""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m or settings.HNSW_M,
+        "hnsw:construction_ef": (ef_construction
+                                 or settings.HNSW_EF_CONSTRUCTION),
+        "hnsw:search_ef": ef_search or settings.HNSW_EF_SEARCH,
+    }
+
+
+def validate_collection(collection, expected_count: int = None,
+                        embedding_model: str = None) -> str:
+    """Why collection is not fit to serve, or None if it is: it must be
+    non-empty (and complete, if expected_count is given), not recorded as
+    built with another embedding model, and find its own sample document."""
+    count = collection.count()
+    if count == 0:
+        return "collection is empty"
+    if expected_count is not None and count != expected_count:
+        return f"has {count} documents, expected {expected_count}"
+    recorded = (collection.metadata or {}).get("embedding_model")
+    if embedding_model and recorded and recorded != embedding_model:
+        return f"was built with {recorded}, not {embedding_model}"
+    sample = collection.peek(limit=1)
+    results = collection.query(query_embeddings=[sample["embeddings"][0]],
+                               n_results=1)
+    if results["ids"][0][:1] != sample["ids"][:1]:
+        return "smoke query did not return its own sample document"
+    return None
 
 
 class VectorStore:
-    def __init__(self):
+    def __init__(self, collection_name: str = None):
+        # chromadb is slow to import; defer it until the store is built.
+        import chromadb
+
         self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
-        self.collection = self.client.get_or_create_collection(
-            name=settings.CHROMA_COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"}
+        # Without an explicit name, serve whatever the pointer names and
+        # follow it when the indexer publishes a new version.
+        self.follows_pointer = collection_name is None
+        self.collection_name = collection_name or read_active_collection()
+        self.collection = self._get_or_create_collection()
+        self._swap_lock = threading.Lock()
+        self._rejected = None
+        if self.follows_pointer:
+            record_serving(self.collection_name)
+
+    def _get_or_create_collection(self):
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata=hnsw_metadata()
         )
 
     def search(self, query_embedding: list, n_results: int = 5,
-               where: dict = None) -> dict:
+               where: dict = None, include_embeddings: bool = False) -> dict:
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
         kwargs = {
             "query_embeddings": [query_embedding],
             "n_results": n_results,
-            "include": ["documents", "metadatas", "distances"]
+            "include": include
         }
         if where:
             kwargs["where"] = where
 
-        return self.collection.query(**kwargs)
+        record_search(where)
+        with span("vector_search"):
+            return self.collection.query(**kwargs)
+
+    def get_metadatas(self, where: dict, limit: int = 1) -> list:
+        """Fetch chunk metadata by filter alone, without a query vector."""
+        record_search(where)
+        with span("vector_search"):
+            results = self.collection.get(
+                where=where, limit=limit, include=["metadatas"]
+            )
+        return results.get("metadatas") or []
+
+    def get_documents(self, where: dict, limit: int = 1) -> dict:
+        """Fetch chunks by filter alone, as flat documents/metadatas lists."""
+        record_search(where)
+        with span("vector_search"):
+            results = self.collection.get(
+                where=where, limit=limit, include=["documents", "metadatas"]
+            )
+        return {"documents": results.get("documents") or [],
+                "metadatas": results.get("metadatas") or []}
 
     def add_documents(self, ids: list, documents: list,
                       embeddings: list, metadatas: list):
-        self.collection.add(
+        self.collection.upsert(
             ids=ids,
             documents=documents,
             embeddings=embeddings,
             metadatas=metadatas
         )
 
+    def warm_up(self):
+        """Run one query so the HNSW index is loaded before real traffic."""
+        sample = self.collection.peek(limit=1)
+        embeddings = sample.get("embeddings")
+        if embeddings is not None and len(embeddings):
+            self.collection.query(query_embeddings=[embeddings[0]],
+                                  n_results=1)
+
     def count(self) -> int:
         return self.collection.count()
+
+    def reset(self):
+        """Drop every document, recreating an empty collection."""
+        self.client.delete_collection(self.collection_name)
+        self.collection = self._get_or_create_collection()
+
+    def drop(self):
+        self.client.delete_collection(self.collection_name)
+
+    def versions(self) -> list:
+        """Collections of this index, with their document counts."""
+        base = settings.CHROMA_COLLECTION_NAME
+        return sorted(
+            ({"name": c.name, "count": c.count(),
+              "active": c.name == self.collection_name}
+             for c in self.client.list_collections()
+             if c.name == base or c.name.startswith(f"{base}__v")),
+            key=lambda v: v["name"]
+        )
+
+    def refresh(self, load_embedder=None):
+        """Switch to the collection the pointer names, if it changed.
+        Returns what activate returns, or None without a switch."""
+        if not self.follows_pointer:
+            return None
+        record_serving(self.collection_name)
+        name = read_active_collection()
+        if name in (self.collection_name, self._rejected):
+            return None
+        try:
+            return self.activate(name, load_embedder)
+        except Exception:
+            # Keep serving the current index; do not retry this version.
+            self._rejected = name
+            raise
+
+    def activate(self, name: str, load_embedder=None, publish: bool = False):
+        """Validate collection name, warm it up and serve from it.
+
+        load_embedder is called with the embedder artifact the collection
+        recorded and returns the embedding service its queries need; the
+        collection must have been built with that service's model. The
+        service is returned (None without load_embedder, or if name is
+        already served) for the caller to swap in.
+
+        Queries already running finish on the old collection; new ones see
+        the new one as soon as the reference is swapped. With publish, the
+        pointer file is updated too so other workers follow. The old
+        collection is dropped after INDEX_GRACE_SECONDS, once no worker is
+        still serving it."""
+        with self._swap_lock:
+            if name == self.collection_name:
+                return None
+            collection = self.client.get_collection(name)
+            embedder = None
+            if load_embedder is not None:
+                embedder = load_embedder(
+                    (collection.metadata or {}).get("embedding_artifact"))
+            problem = validate_collection(
+                collection,
+                embedding_model=embedder.model_name if embedder else None
+            )
+            if problem:
+                raise ValueError(f"Cannot activate {name}: {problem}")
+            if publish:
+                write_active_collection(name)
+            previous = self.collection_name
+            self.collection, self.collection_name = collection, name
+            if self.follows_pointer:
+                record_serving(name)
+            INDEX_SWAPS.inc()
+            print(f"Vector index switched from {previous} to {name}")
+
+        # Without pointer polling other workers neither switch nor keep
+        # their serving notes fresh, so retired versions are left in place.
+        if (settings.INDEX_GRACE_SECONDS >= 0
+                and settings.INDEX_POINTER_POLL_SECONDS > 0):
+            self._schedule_drop(previous)
+        return embedder
+
+    def _schedule_drop(self, name: str):
+        timer = threading.Timer(settings.INDEX_GRACE_SECONDS,
+                                self._drop_retired, args=(name,))
+        timer.daemon = True
+        timer.start()
+
+    def _drop_retired(self, name: str):
+        # Another worker may have dropped it already, or an operator may
+        # have rolled back to it in the meantime.
+        if name in (self.collection_name, read_active_collection()):
+            return
+        # A worker that has not switched yet, or that rejected the new
+        # version, is still querying it; try again after another grace
+        # period.
+        if name in collections_in_use():
+            self._schedule_drop(name)
+            return
+        try:
+            artifact = (self.client.get_collection(name).metadata
+                        or {}).get("embedding_artifact")
+            self.client.delete_collection(name)
+            print(f"Dropped retired vector index {name}")
+        except Exception:
+            return
+        if artifact and artifact != self.embedding_artifact:
+            try:
+                os.remove(artifact)
+            except FileNotFoundError:
+                pass
+
+    @property
+    def embedding_model(self) -> str:
+        """The embedding model recorded by the indexer, if any."""
+        return (self.collection.metadata or {}).get("embedding_model")
+
+    @property
+    def embedding_artifact(self) -> str:
+        """The local embedder file the indexer trained for this collection,
+        if any."""
+        return (self.collection.metadata or {}).get("embedding_artifact")
+
+    def set_embedding_model(self, model_name: str, artifact: str = None):
+        # HNSW settings are fixed at creation and cannot be re-sent here.
+        metadata = {k: v for k, v in (self.collection.metadata or {}).items()
+                    if not k.startswith("hnsw:")}
+        metadata["embedding_model"] = model_name
+        if artifact:
+            metadata["embedding_artifact"] = artifact
+        self.collection.modify(metadata=metadata)
+
+
+def create_vector_store():
+    """The serving store selected by VECTOR_BACKEND."""
+    if settings.VECTOR_BACKEND == "mmap":
+        from services.mmap_index import MmapVectorStore
+        return MmapVectorStore()
+    return VectorStore()
@@ -1,20 +1,34 @@
 const API_BASE_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
 
-export const getAIMessage = async (userQuery, conversationHistory = [], pageUrl = null) => {
+// Recent turns sent to seed a new session when the server no longer has
+// ours (restart, expiry, or a worker without it).
+const FALLBACK_HISTORY_TURNS = 10;
+
+const postChat = (body) =>
+  fetch(`${API_BASE_URL}/api/chat`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+
+export const getAIMessage = async (userQuery, sessionId = null, pageUrl = null, history = []) => {
   try {
-    const body = {
-      message: userQuery,
-      conversation_history: conversationHistory,
-    };
+    // History is kept server-side, so only the new message is sent.
+    const body = { message: userQuery, use_session: true };
     if (pageUrl) {
       body.page_url = pageUrl;
     }
 
-    const response = await fetch(`${API_BASE_URL}/api/chat`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(body),
-    });
+    let response = await postChat(sessionId ? { ...body, session_id: sessionId } : body);
+    if (response.status === 409 && sessionId) {
+      // Session lost: start a new one from our recent messages, once.
+      response = await postChat({
+        ...body,
+        conversation_history: history
+          .slice(-FALLBACK_HISTORY_TURNS)
+          .map(({ role, content }) => ({ role, content })),
+      });
+    }
 
     if (!response.ok) {
       throw new Error(`API error: ${response.status}`);
@@ -26,6 +40,7 @@ export const getAIMessage = async (userQuery, conversationHistory = [], pageUrl
       content: data.content,
       parts: data.parts || [],
       suggested_queries: data.suggested_queries || [],
+      session_id: data.session_id || null,
     };
   } catch (error) {
     console.error("API call failed:", error);
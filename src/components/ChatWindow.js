@@ -29,6 +29,7 @@ function ChatWindow() {
   const [isLoading, setIsLoading] = useState(false);
   const [currentPageUrl, setCurrentPageUrl] = useState(null);
   const [currentPageTitle, setCurrentPageTitle] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
 
   // Detect the currently open tab URL
@@ -77,12 +78,6 @@ function ChatWindow() {
     scrollToBottom();
   }, [messages, isLoading]);
 
-  const getConversationHistory = () => {
-    return messages
-      .filter((m) => m.content)
-      .map((m) => ({ role: m.role, content: m.content }));
-  };
-
   const handleSend = async (text) => {
     const query = typeof text === "string" ? text : input;
     if (query.trim() === "" || isLoading) return;
@@ -92,8 +87,10 @@ function ChatWindow() {
     setIsLoading(true);
 
     try {
-      const history = getConversationHistory();
-      const response = await getAIMessage(query, history, currentPageUrl);
+      const response = await getAIMessage(query, sessionId, currentPageUrl, messages);
+      if (response.session_id) {
+        setSessionId(response.session_id);
+      }
       setMessages((prev) => [...prev, response]);
     } catch (error) {
       setMessages((prev) => [